@@ -1,9 +1,43 @@
 """Agent system prompts for NeoGraph."""
+from functools import lru_cache
+from typing import Optional
+
+from . import analyzer, doc_writer, explorer
+from .base import build_system_prompt
 from .explorer import get_system_prompt as get_explorer_prompt
 from .analyzer import get_system_prompt as get_analyzer_prompt
 from .doc_writer import get_system_prompt as get_doc_writer_prompt
 
+# Static prompt and repository context label per agent type
+AGENT_PROMPTS = {
+    "explorer": (explorer.SYSTEM_PROMPT, explorer.REPO_CONTEXT),
+    "analyzer": (analyzer.SYSTEM_PROMPT, analyzer.REPO_CONTEXT),
+    "doc_writer": (doc_writer.SYSTEM_PROMPT, doc_writer.REPO_CONTEXT),
+}
+
+
+@lru_cache(maxsize=512)
+def get_system_prompt(agent_type: str, repo_id: Optional[str] = None) -> str:
+    """
+    Get system prompt for the specified agent type.
+
+    Prompts only depend on (agent_type, repo_id), so they are memoized; the
+    same string is reused across requests for the same repository.
+
+    Args:
+        agent_type: Type of agent (explorer, analyzer, doc_writer), defaults
+            to explorer when unknown
+        repo_id: Optional repository ID to scope the agent to
+
+    Returns:
+        System prompt string
+    """
+    system_prompt, repo_context = AGENT_PROMPTS.get(agent_type, AGENT_PROMPTS["explorer"])
+    return build_system_prompt(system_prompt, repo_context, repo_id)
+
+
 __all__ = [
+    "get_system_prompt",
     "get_explorer_prompt",
     "get_analyzer_prompt",
     "get_doc_writer_prompt",
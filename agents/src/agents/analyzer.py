@@ -1,4 +1,5 @@
 """Code impact analysis agent system prompt."""
+from .base import build_system_prompt
 
 SYSTEM_PROMPT = """You are a code impact analysis agent.
 Your job is to analyze dependencies and the blast radius of potential changes.
@@ -15,6 +16,8 @@ When asked about dependencies or impact:
 
 Provide actionable insights for safe code changes."""
 
+REPO_CONTEXT = "Analyzing repository"
+
 
 def get_system_prompt(repo_id: str = None) -> str:
     """
@@ -26,9 +29,4 @@ def get_system_prompt(repo_id: str = None) -> str:
     Returns:
         System prompt string
     """
-    prompt = SYSTEM_PROMPT
-
-    if repo_id:
-        prompt += f"\n\nAnalyzing repository: {repo_id}"
-
-    return prompt
+    return build_system_prompt(SYSTEM_PROMPT, REPO_CONTEXT, repo_id)
@@ -0,0 +1,21 @@
+"""Shared helpers for agent system prompts."""
+from typing import Optional
+
+
+def build_system_prompt(
+    system_prompt: str, repo_context: str, repo_id: Optional[str] = None
+) -> str:
+    """
+    Build an agent system prompt, optionally scoped to a repository.
+
+    Args:
+        system_prompt: Static prompt of the agent
+        repo_context: Label introducing the repository (e.g. "Analyzing repository")
+        repo_id: Optional repository ID to scope the agent to
+
+    Returns:
+        System prompt string
+    """
+    if not repo_id:
+        return system_prompt
+    return "".join((system_prompt, "\n\n", repo_context, ": ", repo_id))
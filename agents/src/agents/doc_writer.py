@@ -1,4 +1,5 @@
 """Documentation generation agent system prompt."""
+from .base import build_system_prompt
 
 SYSTEM_PROMPT = """You are a documentation generation agent.
 Your job is to create clear, comprehensive documentation for code.
@@ -18,6 +19,8 @@ When asked to document:
 
 Write documentation in a clear, professional style."""
 
+REPO_CONTEXT = "Generating documentation for repository"
+
 
 def get_system_prompt(repo_id: str = None) -> str:
     """
@@ -29,9 +32,4 @@ def get_system_prompt(repo_id: str = None) -> str:
     Returns:
         System prompt string
     """
-    prompt = SYSTEM_PROMPT
-
-    if repo_id:
-        prompt += f"\n\nGenerating documentation for repository: {repo_id}"
-
-    return prompt
+    return build_system_prompt(SYSTEM_PROMPT, REPO_CONTEXT, repo_id)
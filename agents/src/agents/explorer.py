@@ -1,4 +1,5 @@
 """Code exploration agent system prompt."""
+from .base import build_system_prompt
 
 SYSTEM_PROMPT = """You are a code exploration agent with access to a Neo4j graph database containing indexed code.
 Your job is to help users find and understand code in their repositories.
@@ -15,6 +16,8 @@ When asked to find code:
 
 Always explain what you found and suggest related code to explore."""
 
+REPO_CONTEXT = "Currently exploring repository"
+
 
 def get_system_prompt(repo_id: str = None) -> str:
     """
@@ -26,9 +29,4 @@ def get_system_prompt(repo_id: str = None) -> str:
     Returns:
         System prompt string
     """
-    prompt = SYSTEM_PROMPT
-
-    if repo_id:
-        prompt += f"\n\nCurrently exploring repository: {repo_id}"
-
-    return prompt
+    return build_system_prompt(SYSTEM_PROMPT, REPO_CONTEXT, repo_id)
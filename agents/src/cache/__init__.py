@@ -0,0 +1,5 @@
+"""Caching helpers for agent responses."""
+from .embeddings import embed, estimate_tokens, max_input_tokens
+from .semantic import SemanticCache
+
+__all__ = ["embed", "estimate_tokens", "max_input_tokens", "SemanticCache"]
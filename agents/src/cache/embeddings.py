@@ -0,0 +1,80 @@
+"""Text embeddings via the Text Embeddings Inference (TEI) service."""
+from typing import Optional
+import hashlib
+import httpx
+import numpy as np
+from cachetools import LRUCache
+
+from ..config import settings
+
+# Shared HTTP client for TEI requests
+http_client = httpx.AsyncClient(timeout=settings.tei_timeout)
+
+# Embeddings of recently seen texts, keyed by digest, so a text is sent to
+# TEI once no matter how many lookups reuse it. Stored as float32 arrays
+# (6 KB at 1536 dimensions, against ~48 KB as a list of floats)
+_embedding_cache: LRUCache = LRUCache(maxsize=1024)
+
+# Rough characters per token for code and JSON, on the low side so token
+# counts are overestimated rather than underestimated
+CHARS_PER_TOKEN = 3
+
+# Input limit reported by TEI's /info, fetched on first use
+_max_input_tokens: Optional[int] = None
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of embedder tokens in text."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+async def max_input_tokens() -> Optional[int]:
+    """
+    Return the longest input, in tokens, the TEI model embeds without truncation.
+
+    The limit comes from TEI's /info endpoint and is fetched once; while TEI
+    is unreachable None is returned and the next call asks again.
+
+    Returns:
+        max_input_length of the served model, or None if it is unknown
+    """
+    global _max_input_tokens
+    if _max_input_tokens is None:
+        try:
+            response = await http_client.get(f"{settings.tei_url}/info")
+            response.raise_for_status()
+            _max_input_tokens = int(response.json()["max_input_length"])
+        except (httpx.HTTPError, KeyError, TypeError, ValueError):
+            return None
+    return _max_input_tokens
+
+
+async def embed(text: str) -> np.ndarray:
+    """
+    Embed text using the TEI service.
+
+    Results are memoized per exact text.
+
+    Args:
+        text: Text to embed (truncated by TEI to the model's input limit)
+
+    Returns:
+        Embedding vector as a read-only float32 array
+
+    Raises:
+        httpx.HTTPError: If the TEI request fails
+    """
+    key = hashlib.blake2b(text.encode()).digest()
+    cached = _embedding_cache.get(key)
+    if cached is not None:
+        return cached
+
+    response = await http_client.post(
+        f"{settings.tei_url}/embed",
+        json={"inputs": text, "truncate": True},
+    )
+    response.raise_for_status()
+    embedding = np.asarray(response.json()[0], dtype=np.float32)
+    embedding.flags.writeable = False
+    _embedding_cache[key] = embedding
+    return embedding
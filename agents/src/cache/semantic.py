@@ -0,0 +1,132 @@
+"""In-memory semantic cache keyed by embedding similarity."""
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+import time
+
+import numpy as np
+
+
+def normalize(vector: Sequence[float]) -> np.ndarray:
+    """Scale a vector to unit length so dot products are cosine similarities."""
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    if norm == 0:
+        return array
+    return array / norm
+
+
+class _Partition:
+    """Entries of one namespace, with their vectors stacked for matching."""
+
+    def __init__(self):
+        self.entries: Dict[int, Tuple[np.ndarray, Any]] = {}
+        self._ids: List[int] = []
+        self._matrix: Optional[np.ndarray] = None
+
+    def add(self, entry_id: int, vector: np.ndarray, value: Any) -> None:
+        self.entries[entry_id] = (vector, value)
+        self._matrix = None
+
+    def remove(self, entry_id: int) -> None:
+        del self.entries[entry_id]
+        self._matrix = None
+
+    def best_match(self, query: np.ndarray) -> Tuple[Optional[Any], float]:
+        """Return the value most similar to query and its cosine similarity."""
+        if self._matrix is None:
+            self._ids = list(self.entries)
+            self._matrix = np.stack([vector for vector, _ in self.entries.values()])
+        scores = self._matrix @ query
+        # Newer entries win ties, so a regenerated value replaces a stale one
+        best = len(scores) - 1 - int(np.argmax(scores[::-1]))
+        return self.entries[self._ids[best]][1], float(scores[best])
+
+
+class SemanticCache:
+    """
+    Cache of values looked up by cosine similarity of their embeddings.
+
+    Entries are partitioned by namespace (e.g. agent type and repository) so
+    that similar queries against different scopes never share results, and a
+    lookup only scores the entries of its own namespace in one matrix product.
+    The oldest entries are evicted once maxsize is reached, and entries expire
+    after ttl seconds.
+    """
+
+    def __init__(self, threshold: float, ttl: float, maxsize: int = 1024):
+        """
+        Args:
+            threshold: Minimum cosine similarity for a cache hit
+            ttl: Seconds an entry stays valid
+            maxsize: Maximum number of entries across all namespaces
+        """
+        self.threshold = threshold
+        self.ttl = ttl
+        self.maxsize = maxsize
+        # entry id -> (namespace, expires_at), oldest first; with a single ttl
+        # this is also expiry order
+        self._order: "OrderedDict[int, Tuple[Hashable, float]]" = OrderedDict()
+        self._partitions: Dict[Hashable, _Partition] = {}
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def get(self, namespace: Hashable, embedding: Sequence[float]) -> Optional[Any]:
+        """
+        Find the most similar cached value within a namespace.
+
+        Args:
+            namespace: Scope the lookup is restricted to
+            embedding: Embedding of the query
+
+        Returns:
+            Cached value, or None if no entry is similar enough
+        """
+        self._expire(time.monotonic())
+
+        partition = self._partitions.get(namespace)
+        if partition is None:
+            return None
+
+        value, score = partition.best_match(normalize(embedding))
+        return value if score >= self.threshold else None
+
+    def put(self, namespace: Hashable, embedding: Sequence[float], value: Any) -> None:
+        """
+        Store a value under its embedding.
+
+        Args:
+            namespace: Scope the entry belongs to
+            embedding: Embedding of the query that produced the value
+            value: Value to cache
+        """
+        entry_id = self._next_id
+        self._next_id += 1
+
+        self._order[entry_id] = (namespace, time.monotonic() + self.ttl)
+        self._partitions.setdefault(namespace, _Partition()).add(entry_id, normalize(embedding), value)
+
+        while len(self._order) > self.maxsize:
+            self._evict_oldest()
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        self._order.clear()
+        self._partitions.clear()
+
+    def _expire(self, now: float) -> None:
+        """Drop entries whose ttl has passed."""
+        while self._order:
+            _, expires_at = next(iter(self._order.values()))
+            if expires_at > now:
+                break
+            self._evict_oldest()
+
+    def _evict_oldest(self) -> None:
+        """Remove the oldest entry, and its namespace once that is empty."""
+        entry_id, (namespace, _) = self._order.popitem(last=False)
+        partition = self._partitions[namespace]
+        partition.remove(entry_id)
+        if not partition.entries:
+            del self._partitions[namespace]
@@ -12,13 +12,58 @@ class Settings(BaseSettings):
     anthropic_auth_token: Optional[str] = os.getenv("ANTHROPIC_AUTH_TOKEN")
     anthropic_base_url: Optional[str] = os.getenv("ANTHROPIC_BASE_URL")
 
+    # Anthropic request limits; the SDK retries 429/529 with exponential
+    # backoff, and 0 disables the client-side per-minute limits
+    anthropic_max_retries: int = 5
+    anthropic_requests_per_minute: int = 0
+    anthropic_tokens_per_minute: int = 0
+
     # Model configuration
     model: str = os.getenv("MODEL", "glm-4.6")
+    # Smaller, faster model for lightweight agents (falls back to MODEL)
+    fast_model: Optional[str] = os.getenv("FAST_MODEL")
+    # Most capable model, used for the largest repositories (falls back to MODEL)
+    large_model: Optional[str] = os.getenv("LARGE_MODEL")
 
     # Neo4j connection
     neo4j_uri: str = os.getenv("NEO4J_URI", "bolt://localhost:7687")
     neo4j_user: str = os.getenv("NEO4J_USER", "neo4j")
     neo4j_password: str = os.getenv("NEO4J_PASSWORD", "password")
+    neo4j_database: str = os.getenv("NEO4J_DATABASE", "neo4j")
+    # Connection pool shared by all queries; waiting longer than the
+    # acquisition timeout (seconds) for a free connection fails the query
+    neo4j_pool_size: int = 50
+    neo4j_acquisition_timeout: float = 30.0
+
+    # Text Embeddings Inference (used for semantic caching)
+    tei_url: str = os.getenv("TEI_URL", "http://localhost:8080")
+    tei_timeout: float = 5.0
+
+    # Semantic cache for chat responses
+    semantic_cache_enabled: bool = True
+    semantic_cache_threshold: float = 0.92
+    semantic_cache_ttl: int = 3600
+    semantic_cache_size: int = 1024
+
+    # Semantic cache for generated wiki pages, per repository section; kept
+    # strict and short-lived so changed code is not served stale pages
+    wiki_cache_enabled: bool = True
+    wiki_cache_threshold: float = 0.97
+    wiki_cache_ttl: int = 86400
+    wiki_cache_size: int = 512
+    # Exact-prompt section pages, kept only long enough for retrying a wiki
+    # whose sections partly failed
+    wiki_section_cache_ttl: int = 900
+    # Prompts over the embedder's input limit skip the semantic lookup: TEI
+    # truncates them, so prompts differing only past the limit would embed
+    # identically. 0 uses max_input_length from TEI's /info
+    wiki_cache_max_prompt_tokens: int = 0
+
+    # Repositories generated at once by multi-repository wiki generation, and
+    # section prompts of one repository in flight at once; up to their
+    # product of streams can be open together
+    wiki_concurrency: int = 8
+    wiki_prompt_concurrency: int = 8
 
     # Service configuration
     host: str = "0.0.0.0"
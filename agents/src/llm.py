@@ -0,0 +1,96 @@
+"""Shared Anthropic client for NeoGraph agents."""
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
+import anthropic
+import httpx
+
+from .config import settings
+from .rate_limit import RateLimiter
+
+
+def anthropic_client_kwargs() -> dict[str, Any]:
+    """
+    Build Anthropic client arguments with flexible authentication.
+
+    Supports:
+    - ANTHROPIC_API_KEY: Standard API key authentication
+    - ANTHROPIC_AUTH_TOKEN + ANTHROPIC_BASE_URL: OAuth/custom endpoint
+    """
+    kwargs = {"max_retries": settings.anthropic_max_retries}
+
+    # Set base URL if provided (for custom endpoints)
+    if settings.anthropic_base_url:
+        kwargs["base_url"] = settings.anthropic_base_url
+
+    # Prefer auth token if both base_url and auth_token are set (enterprise/custom)
+    if settings.anthropic_base_url and settings.anthropic_auth_token:
+        kwargs["api_key"] = settings.anthropic_auth_token
+    elif settings.anthropic_api_key:
+        kwargs["api_key"] = settings.anthropic_api_key
+
+    return kwargs
+
+
+def get_async_anthropic_client() -> anthropic.AsyncAnthropic:
+    """
+    Create an async Anthropic client on a pooled HTTP/2 connection.
+
+    Repeated agent-loop calls reuse warm connections instead of paying a new
+    TLS handshake each time.
+    """
+    http_client = anthropic.DefaultAsyncHttpxClient(
+        http2=True,
+        limits=httpx.Limits(
+            max_connections=100,
+            max_keepalive_connections=50,
+            keepalive_expiry=60,
+        ),
+    )
+    return anthropic.AsyncAnthropic(http_client=http_client, **anthropic_client_kwargs())
+
+
+# Initialize the process-wide Anthropic client
+client = get_async_anthropic_client()
+
+# Throttle Claude calls across concurrent requests
+rate_limiter = RateLimiter(
+    requests_per_minute=settings.anthropic_requests_per_minute,
+    tokens_per_minute=settings.anthropic_tokens_per_minute,
+)
+
+
+async def create_message(**kwargs: Any) -> Any:
+    """
+    Call client.messages.create within the client-side rate limits.
+
+    Args:
+        **kwargs: Arguments for messages.create
+
+    Returns:
+        Claude message response
+    """
+    await rate_limiter.acquire()
+    response = await client.messages.create(**kwargs)
+    rate_limiter.record_usage(response.usage.input_tokens + response.usage.output_tokens)
+    return response
+
+
+@asynccontextmanager
+async def stream_message(**kwargs: Any) -> AsyncIterator[Any]:
+    """
+    Open client.messages.stream within the client-side rate limits.
+
+    The usage of the final message is recorded once the block exits, so
+    callers may read stream.get_final_message() themselves or not at all.
+
+    Args:
+        **kwargs: Arguments for messages.stream
+
+    Yields:
+        Claude message stream
+    """
+    await rate_limiter.acquire()
+    async with client.messages.stream(**kwargs) as stream:
+        yield stream
+        response = await stream.get_final_message()
+    rate_limiter.record_usage(response.usage.input_tokens + response.usage.output_tokens)
@@ -0,0 +1,79 @@
+"""Client-side rate limiting for Anthropic API calls."""
+from collections import deque
+from typing import Deque, Tuple
+import asyncio
+import time
+
+
+class RateLimiter:
+    """
+    Sliding-window limiter for requests and tokens per minute.
+
+    acquire() waits until another request fits in the window; callers report
+    the tokens each response consumed with record_usage(). A limit of 0
+    disables that dimension.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: int = 0,
+        tokens_per_minute: int = 0,
+        window: float = 60.0,
+    ):
+        """
+        Args:
+            requests_per_minute: Maximum requests started per window
+            tokens_per_minute: Maximum tokens consumed per window
+            window: Window length in seconds
+        """
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.window = window
+        self._requests: Deque[float] = deque()
+        self._tokens: Deque[Tuple[float, int]] = deque()
+        self._token_total = 0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Wait until a new request is allowed, then count it."""
+        if not self.requests_per_minute and not self.tokens_per_minute:
+            return
+
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._expire(now)
+                wait = self._wait_time(now)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            self._requests.append(now)
+
+    def record_usage(self, tokens: int) -> None:
+        """
+        Count tokens consumed by a completed request.
+
+        Args:
+            tokens: Input plus output tokens of the response
+        """
+        if not self.tokens_per_minute:
+            return
+        self._tokens.append((time.monotonic(), tokens))
+        self._token_total += tokens
+
+    def _expire(self, now: float) -> None:
+        """Drop requests and token usage that fell out of the window."""
+        cutoff = now - self.window
+        while self._requests and self._requests[0] <= cutoff:
+            self._requests.popleft()
+        while self._tokens and self._tokens[0][0] <= cutoff:
+            self._token_total -= self._tokens.popleft()[1]
+
+    def _wait_time(self, now: float) -> float:
+        """Seconds until the oldest entry blocking a new request expires."""
+        wait = 0.0
+        if self.requests_per_minute and len(self._requests) >= self.requests_per_minute:
+            wait = max(wait, self._requests[0] + self.window - now)
+        if self.tokens_per_minute and self._token_total >= self.tokens_per_minute:
+            wait = max(wait, self._tokens[0][0] + self.window - now)
+        return wait
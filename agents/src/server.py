@@ -1,24 +1,36 @@
 """FastAPI server for NeoGraph agents."""
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
-import anthropic
+from typing import Optional, List, Dict, Any, AsyncIterator
+import asyncio
+import httpx
+import json
+import numpy as np
 import os
 import logging
 
 from .config import settings
-from .tools import get_tools, execute_tool
-from .agents import (
-    get_explorer_prompt,
-    get_analyzer_prompt,
-    get_doc_writer_prompt,
-)
-from .wiki import generate_wiki
+from .cache import SemanticCache, embed
+from .llm import create_message, stream_message
+from .tools import get_tools, execute_tool, get_driver, close_driver
+from .agents import get_system_prompt
+from .wiki import fallback_wiki, generate_wiki, generate_wikis, get_wiki_batch, submit_wiki_batch
 
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="NeoGraph Agents")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the Neo4j driver at startup and close it at shutdown."""
+    app.state.neo4j = get_driver()
+    yield
+    close_driver()
+
+
+app = FastAPI(title="NeoGraph Agents", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -28,8 +40,48 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize Anthropic client
-client = anthropic.Anthropic(api_key=settings.anthropic_api_key)
+# Maximum number of Claude calls per chat request (agentic loop bound)
+MAX_ITERATIONS = 10
+
+# Output token budget per agent type; explorer answers are short lookups,
+# documentation needs the most room
+AGENT_MAX_TOKENS = {
+    "explorer": 1024,
+    "analyzer": 2048,
+    "doc_writer": 4096,
+}
+
+# Stop reasons that end the agentic loop with Claude's text as the answer
+FINAL_STOP_REASONS = ("end_turn", "max_tokens")
+
+# Prompt-cache breakpoint marker for stable request prefixes
+CACHE_CONTROL = {"type": "ephemeral"}
+
+# Breakpoints kept on conversation messages, all four the API allows per
+# request. The system prompt and tools (~400 tokens) are below the minimum
+# cacheable length on their own, so they get no breakpoint; they are cached
+# as part of the message prefixes instead
+MAX_MESSAGE_CACHE_BREAKPOINTS = 4
+
+# History compaction: tool results are capped in size, and only those from
+# the most recent turns are kept verbatim. Older results are elided in
+# batches once COMPACT_TOOL_RESULT_TURNS more turns have piled up, because
+# rewriting history invalidates the prompt cache; between batches the
+# conversation prefix stays byte-identical and keeps hitting the cache
+MAX_TOOL_RESULT_CHARS = 4096
+KEEP_TOOL_RESULT_TURNS = 3
+COMPACT_TOOL_RESULT_TURNS = 4
+ELIDED_TOOL_RESULT_PREFIX = "[prior tool result elided"
+
+# Overview text returned when wiki generation fails unexpectedly
+WIKI_ERROR_MESSAGE = "Wiki generation encountered an error. Please try again."
+
+# Semantic cache of final chat responses
+chat_cache = SemanticCache(
+    threshold=settings.semantic_cache_threshold,
+    ttl=settings.semantic_cache_ttl,
+    maxsize=settings.semantic_cache_size,
+)
 
 
 class ChatRequest(BaseModel):
@@ -38,6 +90,7 @@ class ChatRequest(BaseModel):
     message: str
     repo_id: Optional[str] = None
     agent_type: str = "explorer"
+    model: Optional[str] = None
 
 
 class ChatResponse(BaseModel):
@@ -48,9 +101,10 @@ class ChatResponse(BaseModel):
 
 
 class WikiGenerateRequest(BaseModel):
-    """Request model for wiki generation."""
+    """Request model for wiki generation; refresh skips the wiki caches."""
     repo_id: str
     repo_name: str
+    refresh: bool = False
 
 
 class WikiPage(BaseModel):
@@ -68,29 +122,201 @@ class WikiGenerateResponse(BaseModel):
     pages: List[WikiPage]
 
 
-def get_system_prompt(agent_type: str, repo_id: Optional[str] = None) -> str:
+class WikiBatchGenerateRequest(BaseModel):
+    """Request model for batch wiki generation; refresh applies to every repository."""
+    repos: List[WikiGenerateRequest]
+    refresh: bool = False
+
+
+class WikiBatchGenerateResponse(BaseModel):
+    """Response model for batch wiki generation, keyed by repo_id."""
+    wikis: Dict[str, List[WikiPage]]
+
+
+class WikiBatchJobResponse(BaseModel):
+    """Status of a Message Batches wiki job; wikis are set once it has ended."""
+    job_id: str
+    status: str
+    wikis: Optional[Dict[str, List[WikiPage]]] = None
+
+
+def get_model(agent_type: str, model: Optional[str] = None) -> str:
     """
-    Get system prompt for the specified agent type.
+    Pick the Claude model for a chat request.
+
+    Explorer lookups are short tool-driven turns, so they run on the fast
+    model when one is configured; other agents use the default model.
 
     Args:
         agent_type: Type of agent (explorer, analyzer, doc_writer)
-        repo_id: Optional repository ID to scope the agent to
+        model: Optional model explicitly requested by the caller
+
+    Returns:
+        Model name
+    """
+    if model:
+        return model
+    if agent_type == "explorer" and settings.fast_model:
+        return settings.fast_model
+    return settings.model
+
+
+async def embed_message(message: str) -> Optional[np.ndarray]:
+    """
+    Embed a chat message for semantic cache lookups.
+
+    Args:
+        message: User message
+
+    Returns:
+        Embedding vector, or None if caching is disabled or TEI is unavailable
+    """
+    if not settings.semantic_cache_enabled:
+        return None
+
+    try:
+        return await embed(" ".join(message.lower().split()))
+    except httpx.HTTPError as e:
+        logger.warning(f"Embedding failed, skipping semantic cache: {e}")
+        return None
+
+
+def add_cache_breakpoint(
+    blocks: List[Dict[str, Any]], breakpoints: List[Dict[str, Any]]
+) -> None:
+    """
+    Mark the last block of a new message as a prompt-cache breakpoint.
+
+    This lets the next iteration read the whole conversation so far from the
+    prompt cache. Only the newest MAX_MESSAGE_CACHE_BREAKPOINTS blocks stay
+    marked; older markers are removed.
+
+    Args:
+        blocks: Content blocks of the message just appended
+        breakpoints: Blocks currently marked, oldest first (updated in place)
+    """
+    block = blocks[-1]
+    block["cache_control"] = CACHE_CONTROL
+    breakpoints.append(block)
+
+    while len(breakpoints) > MAX_MESSAGE_CACHE_BREAKPOINTS:
+        breakpoints.pop(0).pop("cache_control", None)
+
+
+def format_tool_result(result: Any) -> str:
+    """
+    Serialize a tool result for Claude, truncating very large payloads.
+
+    Args:
+        result: Tool execution result
 
     Returns:
-        System prompt string
+        JSON text of at most MAX_TOOL_RESULT_CHARS characters plus a marker
+    """
+    text = json.dumps(result, default=str)
+    if len(text) > MAX_TOOL_RESULT_CHARS:
+        return text[:MAX_TOOL_RESULT_CHARS] + "...(truncated)"
+    return text
+
+
+def compact_history(messages: List[Dict[str, Any]]) -> None:
     """
-    # Map agent types to their respective prompt functions
-    prompt_functions = {
-        "explorer": get_explorer_prompt,
-        "analyzer": get_analyzer_prompt,
-        "doc_writer": get_doc_writer_prompt,
-    }
+    Elide tool results older than the last KEEP_TOOL_RESULT_TURNS turns.
 
-    # Get the appropriate prompt function, default to explorer
-    prompt_func = prompt_functions.get(agent_type, get_explorer_prompt)
+    Keeps the input size of each iteration bounded regardless of how long
+    the agentic loop runs; Claude has already acted on the elided results.
+    Nothing is rewritten until KEEP_TOOL_RESULT_TURNS +
+    COMPACT_TOOL_RESULT_TURNS turns are verbatim, so the prompt cache is
+    only invalidated once per batch rather than on every iteration.
 
-    # Generate prompt with optional repo_id
-    return prompt_func(repo_id=repo_id)
+    Args:
+        messages: Conversation messages (updated in place)
+    """
+    verbatim_turns = [
+        message for message in messages
+        if message["role"] == "user" and isinstance(message["content"], list)
+        and not is_elided(message)
+    ]
+    if len(verbatim_turns) < KEEP_TOOL_RESULT_TURNS + COMPACT_TOOL_RESULT_TURNS:
+        return
+
+    for message in verbatim_turns[:-KEEP_TOOL_RESULT_TURNS]:
+        for block in message["content"]:
+            if block.get("type") == "tool_result":
+                content = block.get("content", "")
+                block["content"] = f"{ELIDED_TOOL_RESULT_PREFIX}, {len(content)} characters]"
+
+
+def is_elided(message: Dict[str, Any]) -> bool:
+    """Check whether the tool results of a user message were already elided."""
+    return any(
+        block.get("type") == "tool_result"
+        and block.get("content", "").startswith(ELIDED_TOOL_RESULT_PREFIX)
+        for block in message["content"]
+    )
+
+
+async def execute_tool_calls(
+    content: List[Any], tool_calls_log: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """
+    Execute the tool_use blocks of an assistant response.
+
+    Tools requested in the same turn run concurrently, so the turn costs the
+    slowest query rather than the sum of all of them.
+
+    Args:
+        content: Content blocks of the assistant response
+        tool_calls_log: Log that successful tool calls are appended to
+
+    Returns:
+        List of tool_result blocks for the next user message, in request order
+    """
+    tool_use_blocks = [block for block in content if block.type == "tool_use"]
+    for block in tool_use_blocks:
+        logger.info(f"Executing tool: {block.name} with input: {block.input}")
+
+    # Execute the tools off the event loop (Neo4j driver is blocking)
+    results = await asyncio.gather(
+        *[
+            asyncio.to_thread(execute_tool, block.name, block.input)
+            for block in tool_use_blocks
+        ],
+        return_exceptions=True,
+    )
+
+    tool_results = []
+    for block, result in zip(tool_use_blocks, results):
+        if isinstance(result, Exception):
+            logger.error(f"Error executing tool {block.name}: {result}")
+            tool_results.append({
+                "type": "tool_result",
+                "tool_use_id": block.id,
+                "content": f"Error: {str(result)}",
+                "is_error": True
+            })
+            continue
+
+        # Log tool call
+        tool_calls_log.append({
+            "tool": block.name,
+            "input": block.input,
+            "result": result
+        })
+
+        # Add tool result to messages
+        tool_results.append({
+            "type": "tool_result",
+            "tool_use_id": block.id,
+            "content": format_tool_result(result)
+        })
+
+    return tool_results
+
+
+def sse_event(data: Any) -> str:
+    """Format a payload as a server-sent event."""
+    return f"data: {json.dumps(data, default=str)}\n\n"
 
 
 @app.post("/chat", response_model=ChatResponse)
@@ -107,78 +333,59 @@ async def chat(request: ChatRequest):
     # Get tools and system prompt
     tools = get_tools()
     system_prompt = get_system_prompt(request.agent_type, request.repo_id)
+    model = get_model(request.agent_type, request.model)
+    max_tokens = AGENT_MAX_TOKENS.get(request.agent_type, AGENT_MAX_TOKENS["explorer"])
+
+    # Serve semantically duplicate questions from the cache
+    cache_namespace = (request.agent_type, request.repo_id, model)
+    embedding = await embed_message(request.message)
+    if embedding is not None:
+        cached = chat_cache.get(cache_namespace, embedding)
+        if cached is not None:
+            logger.info(f"Semantic cache hit for {request.agent_type} chat request")
+            return cached
 
     # Start conversation with user message
     messages = [{"role": "user", "content": request.message}]
     tool_calls_log = []
+    cache_breakpoints = []
 
     # Agentic loop: handle tool use until we get a final response
-    max_iterations = 10
-    for iteration in range(max_iterations):
+    for iteration in range(MAX_ITERATIONS):
         # Call Claude API
-        response = client.messages.create(
-            model=settings.model,
-            max_tokens=4096,
+        response = await create_message(
+            model=model,
+            max_tokens=max_tokens,
             tools=tools,
             messages=messages,
             system=system_prompt,
         )
 
         # Check stop reason
-        if response.stop_reason == "end_turn":
+        if response.stop_reason in FINAL_STOP_REASONS:
             # Extract final text response
-            response_text = ""
-            for block in response.content:
-                if hasattr(block, "text"):
-                    response_text += block.text
+            response_text = "".join(
+                block.text for block in response.content if hasattr(block, "text")
+            )
 
-            return ChatResponse(
+            chat_response = ChatResponse(
                 response=response_text,
                 tool_calls=tool_calls_log
             )
+            # Truncated answers are returned but not reused
+            if embedding is not None and response.stop_reason == "end_turn":
+                chat_cache.put(cache_namespace, embedding, chat_response)
+            return chat_response
 
         elif response.stop_reason == "tool_use":
             # Add assistant's response to messages
             messages.append({"role": "assistant", "content": response.content})
 
-            # Execute all tool calls
-            tool_results = []
-            for block in response.content:
-                if block.type == "tool_use":
-                    tool_name = block.name
-                    tool_input = block.input
-                    tool_use_id = block.id
-
-                    logger.info(f"Executing tool: {tool_name} with input: {tool_input}")
-
-                    try:
-                        # Execute the tool
-                        result = execute_tool(tool_name, tool_input)
-
-                        # Log tool call
-                        tool_calls_log.append({
-                            "tool": tool_name,
-                            "input": tool_input,
-                            "result": result
-                        })
-
-                        # Add tool result to messages
-                        tool_results.append({
-                            "type": "tool_result",
-                            "tool_use_id": tool_use_id,
-                            "content": str(result)
-                        })
-                    except Exception as e:
-                        logger.error(f"Error executing tool {tool_name}: {e}")
-                        tool_results.append({
-                            "type": "tool_result",
-                            "tool_use_id": tool_use_id,
-                            "content": f"Error: {str(e)}",
-                            "is_error": True
-                        })
-
-            # Add tool results to messages for next iteration
+            # Execute all tool calls and add results for next iteration
+            tool_results = await execute_tool_calls(response.content, tool_calls_log)
+            add_cache_breakpoint(tool_results, cache_breakpoints)
             messages.append({"role": "user", "content": tool_results})
+            compact_history(messages)
 
         else:
             # Unexpected stop reason
@@ -192,6 +399,95 @@ async def chat(request: ChatRequest):
     )
 
 
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Handle chat requests with Claude API, streaming text as server-sent events.
+
+    Text deltas are sent as `{"text": ...}` events while Claude generates them,
+    each executed tool call as a `{"tool_call": ...}` event, and the stream is
+    terminated with a `[DONE]` sentinel.
+
+    Args:
+        request: Chat request with message, optional repo_id, and agent_type
+
+    Returns:
+        StreamingResponse with `text/event-stream` content
+    """
+    tools = get_tools()
+    system_prompt = get_system_prompt(request.agent_type, request.repo_id)
+    model = get_model(request.agent_type, request.model)
+    max_tokens = AGENT_MAX_TOKENS.get(request.agent_type, AGENT_MAX_TOKENS["explorer"])
+
+    # Shares the semantic cache with /chat; the message is embedded once and
+    # the vector reused for both the lookup and the store
+    cache_namespace = (request.agent_type, request.repo_id, model)
+    embedding = await embed_message(request.message)
+
+    async def event_stream() -> AsyncIterator[str]:
+        cached = chat_cache.get(cache_namespace, embedding) if embedding is not None else None
+        if cached is not None:
+            logger.info(f"Semantic cache hit for {request.agent_type} chat stream")
+            for tool_call in cached.tool_calls:
+                yield sse_event({"tool_call": tool_call})
+            yield sse_event({"text": cached.response})
+            yield "data: [DONE]\n\n"
+            return
+
+        messages = [{"role": "user", "content": request.message}]
+        tool_calls_log = []
+        cache_breakpoints = []
+
+        try:
+            for iteration in range(MAX_ITERATIONS):
+                # Whether a turn is terminal is only known once it finishes,
+                # so every turn streams its text as it is generated
+                turn_text = []
+                async with stream_message(
+                    model=model,
+                    max_tokens=max_tokens,
+                    tools=tools,
+                    messages=messages,
+                    system=system_prompt,
+                ) as stream:
+                    async for text in stream.text_stream:
+                        turn_text.append(text)
+                        yield sse_event({"text": text})
+                    response = await stream.get_final_message()
+
+                if response.stop_reason != "tool_use":
+                    if response.stop_reason == "end_turn" and embedding is not None:
+                        chat_cache.put(cache_namespace, embedding, ChatResponse(
+                            response="".join(turn_text),
+                            tool_calls=tool_calls_log
+                        ))
+                    elif response.stop_reason not in FINAL_STOP_REASONS:
+                        logger.warning(f"Unexpected stop reason: {response.stop_reason}")
+                    break
+
+                messages.append({"role": "assistant", "content": response.content})
+
+                logged = len(tool_calls_log)
+                tool_results = await execute_tool_calls(response.content, tool_calls_log)
+                for tool_call in tool_calls_log[logged:]:
+                    yield sse_event({"tool_call": tool_call})
+
+                add_cache_breakpoint(tool_results, cache_breakpoints)
+                messages.append({"role": "user", "content": tool_results})
+                compact_history(messages)
+            else:
+                yield sse_event({
+                    "text": "Maximum iterations reached. Please try rephrasing your question."
+                })
+        except Exception as e:
+            logger.error(f"Chat stream failed: {e}", exc_info=True)
+            yield sse_event({"error": str(e)})
+
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
 @app.post("/wiki/generate", response_model=WikiGenerateResponse)
 async def wiki_generate(request: WikiGenerateRequest):
     """
@@ -206,19 +502,96 @@ async def wiki_generate(request: WikiGenerateRequest):
     logger.info(f"Generating wiki for repo {request.repo_id} ({request.repo_name})")
 
     try:
-        result = generate_wiki(request.repo_id, request.repo_name)
+        result = await generate_wiki(request.repo_id, request.repo_name, refresh=request.refresh)
         return WikiGenerateResponse(pages=result.get("pages", []))
     except Exception as e:
         logger.error(f"Failed to generate wiki: {e}", exc_info=True)
         # Return fallback response instead of crashing
-        return WikiGenerateResponse(pages=[WikiPage(
-            slug="overview",
-            title="Overview",
-            content=f"# {request.repo_name}\n\nWiki generation encountered an error. Please try again.",
-            order=1,
-            parent_slug=None,
-            diagrams=[]
-        )])
+        return WikiGenerateResponse(
+            pages=fallback_wiki(request.repo_name, WIKI_ERROR_MESSAGE)["pages"]
+        )
+
+
+@app.post("/wiki/generate/batch", response_model=WikiBatchGenerateResponse)
+async def wiki_generate_batch(request: WikiBatchGenerateRequest):
+    """
+    Generate wiki pages for several repositories.
+
+    Repositories are generated concurrently and the request returns once
+    every repository has been processed. Use /wiki/batches for bulk jobs
+    that can wait for the Message Batches API.
+
+    Args:
+        request: Batch request with the repositories to document
+
+    Returns:
+        WikiBatchGenerateResponse with generated pages per repository
+    """
+    repos = [(repo.repo_id, repo.repo_name) for repo in request.repos]
+    logger.info(f"Generating wikis for {len(repos)} repositories")
+
+    try:
+        results = await generate_wikis(
+            repos, concurrency=settings.wiki_concurrency, refresh=request.refresh
+        )
+        return WikiBatchGenerateResponse(wikis={
+            repo_id: result.get("pages", []) for repo_id, result in results.items()
+        })
+    except Exception as e:
+        logger.error(f"Failed to generate wiki batch: {e}", exc_info=True)
+        # Return fallback responses instead of crashing
+        return WikiBatchGenerateResponse(wikis={
+            repo_id: fallback_wiki(repo_name, WIKI_ERROR_MESSAGE)["pages"]
+            for repo_id, repo_name in repos
+        })
+
+
+def batch_job_response(job_id: str, status: str, results: Optional[Dict[str, Any]]) -> WikiBatchJobResponse:
+    """Build the response for a wiki batch job from get_wiki_batch's results."""
+    wikis = None
+    if results is not None:
+        wikis = {repo_id: result.get("pages", []) for repo_id, result in results.items()}
+    return WikiBatchJobResponse(job_id=job_id, status=status, wikis=wikis)
+
+
+@app.post("/wiki/batches", response_model=WikiBatchJobResponse)
+async def wiki_batch_submit(request: WikiBatchGenerateRequest):
+    """
+    Submit wiki generation for several repositories as a Message Batch.
+
+    Returns as soon as the batch is submitted; poll /wiki/batches/{job_id}
+    for the result.
+
+    Args:
+        request: Batch request with the repositories to document
+
+    Returns:
+        WikiBatchJobResponse with the job id and its current status
+    """
+    repos = [(repo.repo_id, repo.repo_name) for repo in request.repos]
+    logger.info(f"Submitting wiki batch for {len(repos)} repositories")
+
+    job_id = await submit_wiki_batch(repos, refresh=request.refresh)
+    status, results = await get_wiki_batch(job_id)
+    return batch_job_response(job_id, status, results)
+
+
+@app.get("/wiki/batches/{job_id}", response_model=WikiBatchJobResponse)
+async def wiki_batch_status(job_id: str):
+    """
+    Report a wiki batch job's status, with its wikis once it has ended.
+
+    Args:
+        job_id: Id returned by POST /wiki/batches
+
+    Returns:
+        WikiBatchJobResponse for the job
+    """
+    job = await get_wiki_batch(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown wiki batch job")
+    status, results = job
+    return batch_job_response(job_id, status, results)
 
 
 @app.get("/health")
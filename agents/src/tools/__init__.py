@@ -1,4 +1,4 @@
 """Neo4j tools for Claude agents."""
-from .neo4j_tools import get_tools, execute_tool
+from .neo4j_tools import get_tools, execute_tool, get_driver, close_driver
 
-__all__ = ["get_tools", "execute_tool"]
+__all__ = ["get_tools", "execute_tool", "get_driver", "close_driver"]
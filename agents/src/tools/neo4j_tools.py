@@ -1,81 +1,144 @@
 """Neo4j tools for Claude agents to query the code graph."""
-from neo4j import GraphDatabase
+from cachetools import TTLCache
+from neo4j import Driver, GraphDatabase, RoutingControl
 from typing import Any, Dict, List, Optional
+import atexit
+import hashlib
+import json
 import logging
+import threading
 
 from ..config import settings
 
 logger = logging.getLogger(__name__)
 
-# Initialize Neo4j driver
-driver = GraphDatabase.driver(
-    settings.neo4j_uri,
-    auth=(settings.neo4j_user, settings.neo4j_password)
-)
-
-
-def get_tools() -> List[Dict[str, Any]]:
-    """
-    Return Claude tool definitions for Neo4j operations.
-
-    Returns:
-        List of tool definitions compatible with Claude API
-    """
-    return [
-        {
-            "name": "neo4j_query",
-            "description": "Execute a Cypher query against the Neo4j database to explore code structure",
-            "input_schema": {
-                "type": "object",
-                "properties": {
-                    "query": {
-                        "type": "string",
-                        "description": "Cypher query to execute"
-                    },
+# Neo4j driver, created on first use (or at application startup)
+driver: Optional[Driver] = None
+_driver_lock = threading.Lock()
+
+# Cache of tool results keyed by tool name and canonical arguments
+_tool_cache: TTLCache = TTLCache(maxsize=10_000, ttl=300)
+_tool_cache_lock = threading.Lock()
+
+# Tool definitions are static, so they are built once and shared by all requests
+_TOOLS: List[Dict[str, Any]] = [
+    {
+        "name": "neo4j_query",
+        "description": "Execute a Cypher query against the Neo4j database to explore code structure",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "Cypher query to execute"
                 },
-                "required": ["query"],
             },
+            "required": ["query"],
         },
-        {
-            "name": "blast_radius",
-            "description": "Find all functions that depend on or are affected by changes to a given function",
-            "input_schema": {
-                "type": "object",
-                "properties": {
-                    "function_name": {
-                        "type": "string",
-                        "description": "Name of the function to analyze"
-                    },
-                    "depth": {
-                        "type": "integer",
-                        "description": "How many levels of dependencies to traverse",
-                        "default": 3
-                    },
+    },
+    {
+        "name": "blast_radius",
+        "description": "Find all functions that depend on or are affected by changes to a given function",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "function_name": {
+                    "type": "string",
+                    "description": "Name of the function to analyze"
+                },
+                "depth": {
+                    "type": "integer",
+                    "description": "How many levels of dependencies to traverse",
+                    "default": 3
                 },
-                "required": ["function_name"],
             },
+            "required": ["function_name"],
         },
-        {
-            "name": "find_function",
-            "description": "Search for functions by name pattern",
-            "input_schema": {
-                "type": "object",
-                "properties": {
-                    "pattern": {
-                        "type": "string",
-                        "description": "Function name pattern (supports wildcards with *)"
-                    },
+    },
+    {
+        "name": "find_function",
+        "description": "Search for functions by name pattern",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "pattern": {
+                    "type": "string",
+                    "description": "Function name pattern (supports wildcards with *)"
+                },
+                "ignore_case": {
+                    "type": "boolean",
+                    "description": "Also match names differing only in case; by default an exact name match is returned alone",
+                    "default": False
                 },
-                "required": ["pattern"],
             },
+            "required": ["pattern"],
         },
-    ]
+    },
+]
+
+
+def get_tools() -> List[Dict[str, Any]]:
+    """
+    Return Claude tool definitions for Neo4j operations.
+
+    The same list is returned on every call and must not be mutated.
+
+    Returns:
+        List of tool definitions compatible with Claude API
+    """
+    return _TOOLS
+
+
+def _tool_cache_key(name: str, args: Dict[str, Any]) -> str:
+    """Build a cache key from the tool name and canonical JSON of its arguments."""
+    canonical = json.dumps(args, sort_keys=True, default=str).encode()
+    return f"{name}:{hashlib.blake2b(canonical).hexdigest()}"
+
+
+def _is_error(result: Any) -> bool:
+    """Check whether a tool result reports a failed query."""
+    if isinstance(result, dict):
+        return "error" in result
+    if isinstance(result, list):
+        return any(isinstance(item, dict) and "error" in item for item in result)
+    return False
 
 
 def execute_tool(name: str, args: Dict[str, Any]) -> Any:
     """
     Execute a tool by name with given arguments.
 
+    Successful results are cached for a few minutes, so repeated calls with
+    the same arguments skip the Neo4j round trip.
+
+    Args:
+        name: Tool name to execute
+        args: Tool arguments
+
+    Returns:
+        Tool execution result
+
+    Raises:
+        ValueError: If tool name is unknown
+    """
+    key = _tool_cache_key(name, args)
+    with _tool_cache_lock:
+        cached = _tool_cache.get(key)
+    if cached is not None:
+        logger.info(f"Tool cache hit: {name}")
+        return cached
+
+    result = _run_tool(name, args)
+    if not _is_error(result):
+        with _tool_cache_lock:
+            _tool_cache[key] = result
+    return result
+
+
+def _run_tool(name: str, args: Dict[str, Any]) -> Any:
+    """
+    Dispatch a tool call to its implementation.
+
     Args:
         name: Tool name to execute
         args: Tool arguments
@@ -94,67 +157,73 @@ def execute_tool(name: str, args: Dict[str, Any]) -> Any:
             args.get("depth", 3)
         )
     elif name == "find_function":
-        return find_function(args["pattern"])
+        return find_function(
+            args["pattern"],
+            args.get("ignore_case", False)
+        )
     else:
         raise ValueError(f"Unknown tool: {name}")
 
 
-def neo4j_query(query: str) -> List[Dict[str, Any]]:
+def neo4j_query(query: str, parameters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
     """
     Execute arbitrary Cypher query against Neo4j.
 
+    Values should be passed as parameters rather than spliced into the query
+    text, so Neo4j can reuse the cached plan across calls.
+
     Args:
         query: Cypher query to execute
+        parameters: Query parameters referenced as $name in the query
 
     Returns:
         List of result records as dictionaries
     """
     try:
-        with driver.session() as session:
-            result = session.run(query)
-            records = []
-            for record in result:
-                # Convert record to dictionary
-                records.append(dict(record))
-            return records
+        records, _, _ = get_driver().execute_query(
+            query,
+            parameters_=parameters,
+            database_=settings.neo4j_database,
+            routing_=RoutingControl.READ,
+        )
+        # Convert records to dictionaries
+        return [dict(record) for record in records]
     except Exception as e:
         logger.error(f"Error executing Cypher query: {e}")
         return [{"error": str(e)}]
 
 
-def blast_radius(function_name: str, depth: int = 3) -> Dict[str, Any]:
-    """
-    Find all functions that depend on the given function (blast radius analysis).
-
-    This finds both direct and transitive dependencies up to the specified depth.
-
-    Args:
-        function_name: Name of the function to analyze
-        depth: How many levels of CALLS relationships to traverse
+# Deepest CALLS traversal supported by blast_radius
+MAX_BLAST_RADIUS_DEPTH = 6
 
-    Returns:
-        Dictionary with function info and its dependents
-    """
-    query = """
+BLAST_RADIUS_QUERY = """
     // Find the target function
     MATCH (target:Function {name: $function_name})
     OPTIONAL MATCH (target)<-[:DECLARES]-(file:File)
 
-    // Find all functions that call this function (directly or indirectly)
-    OPTIONAL MATCH path = (caller:Function)-[:CALLS*1..%d]->(target)
-    WHERE caller <> target
-
-    WITH target, file,
-         collect(DISTINCT {
-             name: caller.name,
-             signature: caller.signature,
-             distance: length(path)
-         }) as dependents
-
-    // Count direct vs transitive
-    WITH target, file, dependents,
-         size([d IN dependents WHERE d.distance = 1]) as direct_count,
-         size([d IN dependents WHERE d.distance > 1]) as transitive_count
+    // Find all functions that call this function (directly or indirectly).
+    // APOC takes the depth as a parameter, so one cached plan serves every depth
+    CALL (target) {
+        CALL apoc.path.expandConfig(target, {
+            relationshipFilter: "<CALLS",
+            minLevel: 1,
+            maxLevel: $depth
+        }) YIELD path
+        WITH target, last(nodes(path)) as caller, length(path) as distance
+        WHERE caller:Function AND caller <> target
+
+        // One row per distinct dependent and distance
+        WITH DISTINCT caller, distance
+
+        // Collect dependents and count direct vs transitive in the same pass
+        RETURN collect({
+                   name: caller.name,
+                   signature: caller.signature,
+                   distance: distance
+               }) as dependents,
+               sum(CASE WHEN distance = 1 THEN 1 ELSE 0 END) as direct_count,
+               sum(CASE WHEN distance > 1 THEN 1 ELSE 0 END) as transitive_count
+    }
 
     RETURN {
         function: target.name,
@@ -165,43 +234,48 @@ def blast_radius(function_name: str, depth: int = 3) -> Dict[str, Any]:
         transitive_dependents: transitive_count,
         dependents: dependents
     } as result
-    """ % depth
-
-    try:
-        with driver.session() as session:
-            result = session.run(query, {"function_name": function_name})
-            record = result.single()
-            if record:
-                return record["result"]
-            else:
-                return {
-                    "error": f"Function '{function_name}' not found",
-                    "function": function_name
-                }
-    except Exception as e:
-        logger.error(f"Error in blast_radius: {e}")
-        return {"error": str(e), "function": function_name}
+    """
 
 
-def find_function(pattern: str) -> List[Dict[str, Any]]:
+def blast_radius(function_name: str, depth: int = 3) -> Dict[str, Any]:
     """
-    Search for functions by name pattern.
+    Find all functions that depend on the given function (blast radius analysis).
 
-    Supports wildcards with *.
-    Example: "process*" finds all functions starting with "process"
+    This finds both direct and transitive dependencies up to the specified depth.
+    Traversal uses APOC path expansion, so the APOC plugin must be installed.
 
     Args:
-        pattern: Function name pattern with optional wildcards
+        function_name: Name of the function to analyze
+        depth: How many levels of CALLS relationships to traverse
+            (clamped to 1..MAX_BLAST_RADIUS_DEPTH)
 
     Returns:
-        List of matching functions with their metadata
+        Dictionary with function info and its dependents
     """
-    # Convert * wildcards to Neo4j regex pattern
-    regex_pattern = pattern.replace("*", ".*")
+    depth = max(1, min(int(depth), MAX_BLAST_RADIUS_DEPTH))
 
-    query = """
-    MATCH (fn:Function)
-    WHERE fn.name =~ $pattern
+    try:
+        records, _, _ = get_driver().execute_query(
+            BLAST_RADIUS_QUERY,
+            function_name=function_name,
+            depth=depth,
+            database_=settings.neo4j_database,
+            routing_=RoutingControl.READ,
+        )
+        if records:
+            return records[0]["result"]
+        else:
+            return {
+                "error": f"Function '{function_name}' not found",
+                "function": function_name
+            }
+    except Exception as e:
+        logger.error(f"Error in blast_radius: {e}")
+        return {"error": str(e), "function": function_name}
+
+
+# Shared tail of the find_function queries, applied to the matched functions
+_FIND_FUNCTION_RESULT = """
     OPTIONAL MATCH (fn)<-[:DECLARES]-(file:File)
     OPTIONAL MATCH (file)<-[:CONTAINS]-(repo:Repository)
 
@@ -227,18 +301,93 @@ def find_function(pattern: str) -> List[Dict[str, Any]]:
     LIMIT 50
     """
 
+# Exact name lookup, served by the Function(name) index
+FIND_FUNCTION_EXACT_QUERY = """
+    MATCH (fn:Function)
+    WHERE fn.name = $name
+    """ + _FIND_FUNCTION_RESULT
+
+# Case-insensitive pattern search, scans all functions
+FIND_FUNCTION_QUERY = """
+    MATCH (fn:Function)
+    WHERE fn.name =~ $pattern
+    """ + _FIND_FUNCTION_RESULT
+
+
+def find_function(pattern: str, ignore_case: bool = False) -> List[Dict[str, Any]]:
+    """
+    Search for functions by name pattern.
+
+    Supports wildcards with *.
+    Example: "process*" finds all functions starting with "process"
+
+    Patterns are matched case-insensitively, except that a pattern without
+    wildcards is first looked up as an exact name through the name index.
+    When that finds functions they are returned alone, so names differing
+    only in case (e.g. "Parse" for "parse") are left out unless ignore_case
+    is set.
+
+    Args:
+        pattern: Function name pattern with optional wildcards
+        ignore_case: Skip the exact lookup and always search case-insensitively
+
+    Returns:
+        List of matching functions with their metadata
+    """
     try:
-        with driver.session() as session:
-            result = session.run(query, {"pattern": f"(?i){regex_pattern}"})
-            functions = []
-            for record in result:
-                functions.append(record["function"])
-            return functions
+        if "*" not in pattern and not ignore_case:
+            records, _, _ = get_driver().execute_query(
+                FIND_FUNCTION_EXACT_QUERY,
+                name=pattern,
+                database_=settings.neo4j_database,
+                routing_=RoutingControl.READ,
+            )
+            if records:
+                return [record["function"] for record in records]
+
+        # Convert * wildcards to Neo4j regex pattern
+        regex_pattern = pattern.replace("*", ".*")
+
+        records, _, _ = get_driver().execute_query(
+            FIND_FUNCTION_QUERY,
+            pattern=f"(?i){regex_pattern}",
+            database_=settings.neo4j_database,
+            routing_=RoutingControl.READ,
+        )
+        return [record["function"] for record in records]
     except Exception as e:
         logger.error(f"Error in find_function: {e}")
         return [{"error": str(e)}]
 
 
+def get_driver() -> Driver:
+    """
+    Return the shared Neo4j driver, creating it on first use.
+
+    Returns:
+        Neo4j driver with a connection pool shared by all tool calls
+    """
+    global driver
+    if driver is None:
+        with _driver_lock:
+            if driver is None:
+                driver = GraphDatabase.driver(
+                    settings.neo4j_uri,
+                    auth=(settings.neo4j_user, settings.neo4j_password),
+                    max_connection_pool_size=settings.neo4j_pool_size,
+                    connection_acquisition_timeout=settings.neo4j_acquisition_timeout,
+                )
+    return driver
+
+
 def close_driver():
     """Close Neo4j driver connection."""
-    driver.close()
+    global driver
+    with _driver_lock:
+        if driver is not None:
+            driver.close()
+            driver = None
+
+
+# Scripts and workers without the FastAPI lifespan still release the pool
+atexit.register(close_driver)
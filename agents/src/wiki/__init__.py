@@ -1,4 +1,10 @@
 """Wiki generation module."""
-from .generator import generate_wiki
+from .generator import fallback_wiki, generate_wiki, generate_wikis, get_wiki_batch, submit_wiki_batch
 
-__all__ = ["generate_wiki"]
+__all__ = [
+    "fallback_wiki",
+    "generate_wiki",
+    "generate_wikis",
+    "get_wiki_batch",
+    "submit_wiki_batch",
+]
@@ -1,159 +1,289 @@
 """Wiki generation using Claude."""
-import json
+import asyncio
+import hashlib
+import io
 import logging
 import re
-from typing import Any
-
-import anthropic
-
+import threading
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+import httpx
+import numpy as np
+import orjson
+from cachetools import LRUCache, TTLCache
+
+from ..cache import SemanticCache, embed, estimate_tokens, max_input_tokens
 from ..config import settings
+from ..llm import client, stream_message
 from ..tools.neo4j_tools import neo4j_query
 
 logger = logging.getLogger(__name__)
 
+# Output budget per call; each prompt covers the overview or a single module
+WIKI_MAX_TOKENS = 8192
+
+# Repositories declaring fewer functions and classes than this are
+# documented directly from their structure, without calling Claude
+TRIVIAL_REPO_DECLARATIONS = 3
+
+# Repositories declaring fewer functions and classes than this are
+# documented with FAST_MODEL, and at least LARGE_REPO_DECLARATIONS with
+# LARGE_MODEL, when those are configured
+SMALL_REPO_DECLARATIONS = 30
+LARGE_REPO_DECLARATIONS = 300
+
+# Extensions stripped from files directly under src/ to name their module
+SOURCE_EXTENSIONS = (".py", ".go", ".ts")
+
+# Docstrings are cut to this many characters in prompts
+MAX_DOCSTRING_CHARS = 120
+
+NO_STRUCTURE_MESSAGE = "No code structure found. Please ensure the repository has been indexed."
+
+# Code structures keyed by (repo_id, lastIndexed), so re-indexing a
+# repository naturally invalidates its entry
+_structure_cache: LRUCache = LRUCache(maxsize=128)
+_structure_cache_lock = threading.Lock()
+
+# Generated pages per repository section, looked up by the embedding of the
+# section prompt, so near-identical structures skip the Claude call
+wiki_cache = SemanticCache(
+    threshold=settings.wiki_cache_threshold,
+    ttl=settings.wiki_cache_ttl,
+    maxsize=settings.wiki_cache_size,
+)
+
+# Pages of every section generated successfully, keyed by the exact prompt
+# and stored as soon as the section completes, so retrying a wiki with
+# failed sections only regenerates those sections (with or without TEI).
+# Kept briefly: a later regeneration of an unchanged wiki is deliberate
+_section_cache: TTLCache = TTLCache(maxsize=settings.wiki_cache_size, ttl=settings.wiki_section_cache_ttl)
+
+REPO_VERSION_QUERY = """
+    MATCH (repo:Repository {id: $repo_id})
+    RETURN repo.lastIndexed as version
+    """
 
-def get_anthropic_client() -> anthropic.Anthropic:
+# The structure is read with three independent queries run concurrently
+# and joined on file path, rather than one query joining files with both
+# their functions and their classes
+FILES_QUERY = """
+    MATCH (repo:Repository {id: $repo_id})-[:CONTAINS]->(file:File)
+    RETURN file.path as path, file.language as language
+    ORDER BY path
     """
-    Create Anthropic client with flexible authentication.
 
-    Supports:
-    - ANTHROPIC_API_KEY: Standard API key authentication
-    - ANTHROPIC_AUTH_TOKEN + ANTHROPIC_BASE_URL: OAuth/custom endpoint
+FILE_FUNCTIONS_QUERY = """
+    MATCH (repo:Repository {id: $repo_id})-[:CONTAINS]->(file:File)-[:DECLARES]->(fn:Function|Method)
+    WHERE fn.name <> ""
+    WITH file, fn
+    ORDER BY fn.startLine
+    RETURN file.path as path, collect({
+        name: fn.name,
+        signature: fn.signature,
+        docstring: fn.docstring
+    }) as entries
     """
-    kwargs = {}
 
-    # Set base URL if provided (for custom endpoints)
-    if settings.anthropic_base_url:
-        kwargs["base_url"] = settings.anthropic_base_url
+FILE_CLASSES_QUERY = """
+    MATCH (repo:Repository {id: $repo_id})-[:CONTAINS]->(file:File)-[:DECLARES]->(cls:Class)
+    WHERE cls.name <> ""
+    WITH file, cls
+    ORDER BY cls.startLine
+    RETURN file.path as path, collect({
+        name: cls.name,
+        docstring: cls.docstring
+    }) as entries
+    """
 
-    # Prefer auth token if both base_url and auth_token are set (enterprise/custom)
-    if settings.anthropic_base_url and settings.anthropic_auth_token:
-        kwargs["api_key"] = settings.anthropic_auth_token
-    elif settings.anthropic_api_key:
-        kwargs["api_key"] = settings.anthropic_api_key
 
-    return anthropic.Anthropic(**kwargs)
+def is_valid_repo_id(repo_id: str) -> bool:
+    """Check that a repository ID is a UUID in its canonical hyphenated form."""
+    try:
+        # UUID() also accepts braces, URNs and missing hyphens, which the
+        # indexer never produces
+        return str(uuid.UUID(repo_id)) == repo_id.lower()
+    except ValueError:
+        return False
 
 
-# Initialize Anthropic client
-client = get_anthropic_client()
+async def get_code_structure(repo_id: str) -> dict[str, Any]:
+    """
+    Return repository code structure with detailed function information.
 
+    Structures are cached per indexed version of the repository, so repeated
+    generations only pay for a one-row version lookup. The returned
+    dictionary is shared between callers and must not be mutated.
 
-def get_code_structure(repo_id: str) -> dict[str, Any]:
+    Args:
+        repo_id: Repository ID
+
+    Returns:
+        Dictionary with files grouped by directory, including function details
+    """
+    if not is_valid_repo_id(repo_id):
+        logger.error(f"Invalid repo_id format: {repo_id}")
+        return {}
+
+    records = await asyncio.to_thread(neo4j_query, REPO_VERSION_QUERY, {"repo_id": repo_id})
+    if not records or "error" in records[0]:
+        return await query_code_structure(repo_id)
+
+    key = (repo_id, str(records[0]["version"]))
+    with _structure_cache_lock:
+        modules = _structure_cache.get(key)
+    if modules is not None:
+        logger.info(f"Code structure cache hit: {repo_id}")
+        return modules
+
+    modules = await query_code_structure(repo_id)
+    # Empty results may come from an index still in progress, don't pin them
+    if modules:
+        with _structure_cache_lock:
+            _structure_cache[key] = modules
+    return modules
+
+
+async def query_code_structure(repo_id: str) -> dict[str, Any]:
     """
     Query Neo4j for repository code structure with detailed function information.
 
+    Files, functions and classes are fetched concurrently on the shared
+    driver pool and joined by file path.
+
     Args:
         repo_id: Repository ID
 
     Returns:
-        Dictionary with files grouped by directory, including function details
+        Dictionary with files grouped by directory, including function
+        details, or an empty dictionary if any query fails
     """
-    query = """
-    MATCH (repo:Repository {id: $repo_id})-[:CONTAINS]->(file:File)
-    OPTIONAL MATCH (file)-[:DECLARES]->(fn:Function|Method)
-    WITH file, collect({
-        name: fn.name,
-        signature: fn.signature,
-        docstring: fn.docstring,
-        startLine: fn.startLine,
-        endLine: fn.endLine
-    }) as functions
-    OPTIONAL MATCH (file)-[:DECLARES]->(cls:Class)
-    WITH file, functions, collect({
-        name: cls.name,
-        docstring: cls.docstring,
-        startLine: cls.startLine,
-        endLine: cls.endLine
-    }) as classes
-    RETURN {
-        path: file.path,
-        language: file.language,
-        functions: functions,
-        classes: classes
-    } as file
-    ORDER BY file.path
-    """
-
-    # Validate repo_id is a valid UUID to prevent injection
-    if not re.match(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$', repo_id, re.I):
-        logger.error(f"Invalid repo_id format: {repo_id}")
+    parameters = {"repo_id": repo_id}
+    files, functions, classes = await asyncio.gather(*(
+        asyncio.to_thread(neo4j_query, query, parameters)
+        for query in (FILES_QUERY, FILE_FUNCTIONS_QUERY, FILE_CLASSES_QUERY)
+    ))
+
+    # A partial structure would be cached and documented as complete
+    if any("error" in record for record in (*files, *functions, *classes)):
+        logger.error(f"Failed to query code structure for {repo_id}")
         return {}
 
-    results = neo4j_query(query.replace("$repo_id", f"'{repo_id}'"))
+    functions_by_path = {record["path"]: record["entries"] for record in functions}
+    classes_by_path = {record["path"]: record["entries"] for record in classes}
 
     # Group files by directory
-    modules = {}
-    for record in results:
-        if "error" in record:
-            continue
-        file_data = record.get("file", record)
-        path = file_data.get("path", "")
-
-        # Filter out null entries from functions and classes
-        if "functions" in file_data:
-            file_data["functions"] = [f for f in file_data["functions"] if f.get("name")]
-        if "classes" in file_data:
-            file_data["classes"] = [c for c in file_data["classes"] if c.get("name")]
-
-        # Extract directory as module name
-        parts = path.split("/")
-        if len(parts) > 1:
-            module = parts[-2] if parts[-2] != "src" else parts[-1].replace(".py", "").replace(".go", "").replace(".ts", "")
-        else:
-            module = "root"
-
-        if module not in modules:
-            modules[module] = []
-        modules[module].append(file_data)
+    modules = defaultdict(list)
+    for record in files:
+        path = record["path"] or ""
+        modules[module_name(path)].append(compact_file({
+            "path": path,
+            "language": record["language"],
+            "functions": functions_by_path.get(path, []),
+            "classes": classes_by_path.get(path, []),
+        }))
 
-    return modules
+    return dict(modules)
 
 
-def fix_json_newlines(text: str) -> str:
-    """
-    Fix unescaped newlines inside JSON string values.
+def compact_entry(entry: dict[str, Any]) -> dict[str, Any]:
+    """Drop empty fields of a function or class and shorten its docstring."""
+    compacted = {key: value for key, value in entry.items() if value}
+    if "docstring" in compacted:
+        compacted["docstring"] = compacted["docstring"][:MAX_DOCSTRING_CHARS]
+    return compacted
 
-    Claude sometimes outputs actual newlines in JSON strings instead of \\n.
-    This function attempts to fix that.
+
+def compact_file(file_data: dict[str, Any]) -> dict[str, Any]:
     """
-    result = []
-    in_string = False
-    escape_next = False
+    Prune a file's declarations to what the wiki prompt needs.
 
-    for char in text:
-        if escape_next:
-            result.append(char)
-            escape_next = False
-            continue
+    Undocumented private functions are dropped (dunder methods are kept),
+    docstrings are truncated to MAX_DOCSTRING_CHARS, and functions repeating
+    both the signature and docstring of an earlier one are collapsed into it.
+    Methods of different classes often share a bare signature such as
+    `def run(self):`, so the signature alone does not identify a duplicate.
+
+    Args:
+        file_data: File with its functions and classes
 
-        if char == '\\':
-            escape_next = True
-            result.append(char)
+    Returns:
+        Compacted copy of the file
+    """
+    functions = []
+    seen = set()
+    for fn in file_data["functions"]:
+        name = fn["name"]
+        if name.startswith("_") and not name.endswith("__") and not fn.get("docstring"):
             continue
 
-        if char == '"' and not escape_next:
-            in_string = not in_string
-            result.append(char)
+        compacted = compact_entry(fn)
+        key = (compacted.get("signature") or name, compacted.get("docstring"))
+        if key in seen:
             continue
+        seen.add(key)
+        functions.append(compacted)
 
-        if in_string and char == '\n':
-            # Replace actual newline with escaped newline
-            result.append('\\n')
-        elif in_string and char == '\t':
-            result.append('\\t')
-        else:
-            result.append(char)
+    return {
+        **file_data,
+        "functions": functions,
+        "classes": [compact_entry(cls) for cls in file_data["classes"]],
+    }
 
-    return ''.join(result)
 
+def module_name(path: str) -> str:
+    """
+    Derive the wiki module a file belongs to from its path.
 
-WIKI_PROMPT = """You are generating comprehensive, detailed documentation with diagrams for a code repository, similar to DeepWiki.
+    Files are grouped by parent directory. Files directly under src/ are
+    modules of their own, named after the file without its language extension.
+    """
+    directory, separator, filename = path.rpartition("/")
+    if not separator:
+        return "root"
 
-## Repository: {repo_name}
+    parent = directory.rpartition("/")[2]
+    if parent != "src":
+        return parent
+    for extension in SOURCE_EXTENSIONS:
+        if filename.endswith(extension):
+            return filename.removesuffix(extension)
+    return filename
 
-## Code Structure (includes functions, classes, docstrings):
-{code_structure}
+
+# Backslash escapes and quotes, the only tokens that change JSON string state
+_JSON_TOKEN_RE = re.compile(r'(\\[\s\S]?|")')
+
+
+def fix_json_newlines(text: str) -> str:
+    """
+    Fix unescaped newlines inside JSON string values.
+
+    Claude sometimes outputs actual newlines in JSON strings instead of \\n.
+    This function attempts to fix that. The text is split on escapes and
+    quotes by a compiled regex, so only the segments between them are
+    visited rather than every character.
+    """
+    # Even indexes hold plain text, odd indexes the escape or quote after it
+    parts = _JSON_TOKEN_RE.split(text)
+    in_string = False
+
+    for i in range(0, len(parts), 2):
+        if in_string:
+            parts[i] = parts[i].replace('\n', '\\n').replace('\t', '\\t')
+        if i + 1 < len(parts) and parts[i + 1] == '"':
+            in_string = not in_string
+
+    return ''.join(parts)
+
+
+# Static wiki instructions, sent as a cached system prompt shared by every
+# generation; only the repository prompt below varies per call
+WIKI_SYSTEM_PROMPT = """You are generating comprehensive, detailed documentation with diagrams for a code repository, similar to DeepWiki.
+The repository name and its code structure are given in the user message.
 
 ## Instructions:
 Generate an extensive multi-page wiki with:
@@ -252,21 +382,21 @@ print(result)  # Expected output
 3. **Class Diagrams** - OOP structures, interfaces, data models
    ```mermaid
    classDiagram
-       class ClassName {{
+       class ClassName {
            +property: type
            +method(): returnType
-       }}
+       }
        ClassName <|-- SubClass
    ```
 
 4. **ER Diagrams** - Data models, database schemas, relationships
    ```mermaid
    erDiagram
-       ENTITY1 ||--o{{ ENTITY2 : relationship
-       ENTITY1 {{
+       ENTITY1 ||--o{ ENTITY2 : relationship
+       ENTITY1 {
            string id
            string name
-       }}
+       }
    ```
 
 ### Diagram Placement:
@@ -277,34 +407,34 @@ print(result)  # Expected output
 
 ## Output Format:
 Return ONLY valid JSON (no markdown wrapper, no explanation) with this structure:
-{{
+{
   "pages": [
-    {{
+    {
       "slug": "overview",
       "title": "Project Overview",
-      "content": "# {repo_name}\\n\\nComprehensive description...\\n\\n## System Architecture\\n\\n```mermaid\\ngraph TD\\n    A[Module] --> B[Module]\\n```\\n\\n## Technology Stack\\n\\n- Language: ...\\n- Framework: ...\\n\\n## Key Modules\\n\\n...",
+      "content": "# Repository Name\\n\\nComprehensive description...\\n\\n## System Architecture\\n\\n```mermaid\\ngraph TD\\n    A[Module] --> B[Module]\\n```\\n\\n## Technology Stack\\n\\n- Language: ...\\n- Framework: ...\\n\\n## Key Modules\\n\\n...",
       "order": 1,
       "parent_slug": null,
       "diagrams": [...]
-    }},
-    {{
+    },
+    {
       "slug": "module-name",
       "title": "Module Name",
       "content": "# Module Name\\n\\nDetailed purpose...\\n\\n## Files\\n\\n- file1.py: description\\n- file2.py: description\\n\\n## Architecture\\n\\n```mermaid\\ngraph TD\\n    A --> B\\n```",
       "order": 2,
       "parent_slug": "overview",
       "diagrams": [...]
-    }},
-    {{
+    },
+    {
       "slug": "module-name-filename",
       "title": "filename.py",
       "content": "# filename.py\\n\\nFile purpose...\\n\\n## Functions\\n\\n### `function1(param)`\\n\\n**Purpose**: ...\\n\\n**Parameters**:\\n- `param` (str): ...\\n\\n**Returns**: ...\\n\\n**Example**:\\n```python\\nresult = function1('test')\\n```\\n\\n**Edge Cases**:\\n- ...",
       "order": 11,
       "parent_slug": "module-name",
       "diagrams": [...]
-    }}
+    }
   ]
-}}
+}
 
 CRITICAL JSON FORMATTING RULES:
 - Return ONLY valid JSON, no text before or after
@@ -313,93 +443,600 @@ CRITICAL JSON FORMATTING RULES:
 - Escape backticks in code examples: \\`\\`\\`language
 - Example correct: "content": "Line 1\\nLine 2\\n\\`\\`\\`python\\ncode\\n\\`\\`\\`"
 - Each page should have 1-3 diagrams minimum
-- Generate 10-20 pages total for comprehensive coverage
+- Generate only the pages requested in the user message
 - Include detailed function documentation with examples
 - Make diagrams detailed with meaningful node names from the actual code
 """
 
+WIKI_SYSTEM = [{"type": "text", "text": WIKI_SYSTEM_PROMPT, "cache_control": {"type": "ephemeral"}}]
+
 
-def generate_wiki(repo_id: str, repo_name: str) -> dict[str, Any]:
+def fallback_wiki(repo_name: str, message: str) -> dict[str, Any]:
     """
-    Generate wiki pages for a repository using Claude.
+    Build a single-page wiki used when generation cannot produce pages.
 
     Args:
-        repo_id: Repository ID
         repo_name: Repository name for display
+        message: Explanation shown on the overview page
 
     Returns:
         Dictionary with 'pages' list
     """
-    # Get code structure from Neo4j
-    modules = get_code_structure(repo_id)
-
-    if not modules:
-        return {
-            "pages": [{
-                "slug": "overview",
-                "title": "Overview",
-                "content": f"# {repo_name}\n\nNo code structure found. Please ensure the repository has been indexed.",
-                "order": 1,
-                "parent_slug": None,
-                "diagrams": []
-            }]
-        }
-
-    # Format code structure for prompt
-    code_structure = json.dumps(modules, indent=2)
-
-    # Build prompt
-    prompt = WIKI_PROMPT.format(
-        repo_name=repo_name,
-        code_structure=code_structure
+    return {
+        "pages": [{
+            "slug": "overview",
+            "title": "Overview",
+            "content": f"# {repo_name}\n\n{message}",
+            "order": 1,
+            "parent_slug": None,
+            "diagrams": []
+        }]
+    }
+
+
+def count_declarations(modules: dict[str, Any]) -> int:
+    """Count the functions and classes across all files of a code structure."""
+    return sum(
+        len(file_data["functions"]) + len(file_data["classes"])
+        for files in modules.values()
+        for file_data in files
     )
 
-    logger.info(f"Generating wiki for {repo_name} with {len(modules)} modules")
 
-    # Call Claude with extended token limit for comprehensive documentation
-    response = client.messages.create(
-        model=settings.model,
-        max_tokens=16384,
-        messages=[{"role": "user", "content": prompt}]
-    )
+def pick_wiki_model(modules: dict[str, Any]) -> str:
+    """
+    Choose the model tier for a repository's wiki from its size.
+
+    Args:
+        modules: Code structure from get_code_structure
+
+    Returns:
+        Model name
+    """
+    declarations = count_declarations(modules)
+    if declarations < SMALL_REPO_DECLARATIONS and settings.fast_model:
+        return settings.fast_model
+    if declarations >= LARGE_REPO_DECLARATIONS and settings.large_model:
+        return settings.large_model
+    return settings.model
+
+
+def render_structure_wiki(repo_name: str, modules: dict[str, Any]) -> dict[str, Any]:
+    """
+    Render a single-page wiki straight from a small repository's structure.
+
+    Args:
+        repo_name: Repository name for display
+        modules: Code structure from get_code_structure
+
+    Returns:
+        Dictionary with 'pages' list
+    """
+    lines = [f"# {repo_name}", "", "## Files"]
+    for files in modules.values():
+        for file_data in files:
+            language = f" ({file_data['language']})" if file_data.get("language") else ""
+            lines += ["", f"### `{file_data['path']}`{language}", ""]
+
+            entries = [
+                (f"class `{cls['name']}`", cls.get("docstring")) for cls in file_data["classes"]
+            ] + [
+                (f"`{fn.get('signature') or fn['name']}`", fn.get("docstring")) for fn in file_data["functions"]
+            ]
+            for title, docstring in entries:
+                lines.append(f"- {title}: {docstring}" if docstring else f"- {title}")
+            if not entries:
+                lines.append("No functions or classes.")
+
+    return {
+        "pages": [{
+            "slug": "overview",
+            "title": "Overview",
+            "content": "\n".join(lines),
+            "order": 1,
+            "parent_slug": None,
+            "diagrams": []
+        }]
+    }
+
+
+# The per-repository prompts are f-strings, compiled once with the module
+# rather than parsed by str.format on every call
+def overview_prompt(repo_name: str, modules: str) -> str:
+    """Build the prompt for the overview page from the module/file listing."""
+    return f"""## Repository: {repo_name}
+
+## Modules and their files:
+{modules}
+
+## Pages to generate:
+Generate ONLY the "overview" page (order 1, parent_slug null). Each module and its files are documented separately, so describe the modules at a high level.
+"""
 
-    # Extract response text
-    response_text = ""
-    for block in response.content:
-        if hasattr(block, "text"):
-            response_text += block.text
 
-    # Parse JSON response
+def module_prompt(repo_name: str, module: str, code_structure: str) -> str:
+    """Build the prompt for a module page and its file pages."""
+    return f"""## Repository: {repo_name}
+
+## Module: {module}
+
+## Code Structure (includes functions, classes, docstrings):
+{code_structure}
+
+## Pages to generate:
+Generate ONLY the page for the "{module}" module (parent_slug "overview") and a page for each of its files (parent_slug set to the module page slug). The overview and the other modules are documented separately.
+"""
+
+
+def compact_json(value: Any) -> str:
+    """Serialize value for a prompt without indentation or padding, which only cost tokens."""
+    return orjson.dumps(value, default=str).decode()
+
+
+def build_wiki_prompts(repo_name: str, modules: dict[str, Any]) -> list[str]:
+    """
+    Build the user prompts for a repository, sent alongside WIKI_SYSTEM.
+
+    The first prompt asks for the overview page, followed by one prompt per
+    module for the module page and its file pages.
+
+    Args:
+        repo_name: Repository name for display
+        modules: Code structure from get_code_structure
+
+    Returns:
+        List of prompt strings
+    """
+    module_files = {
+        module: [file_data.get("path", "") for file_data in files]
+        for module, files in modules.items()
+    }
+    prompts = [overview_prompt(repo_name, compact_json(module_files))]
+    for module, files in modules.items():
+        prompts.append(module_prompt(repo_name, module, compact_json(files)))
+
+    return prompts
+
+
+# A whole response wrapped in a markdown code block, with any language tag
+_CODE_FENCE_RE = re.compile(r"```[^\n]*\n(.*?)\s*```", re.DOTALL)
+
+
+def parse_wiki_pages(response_text: str) -> Optional[list[dict[str, Any]]]:
+    """
+    Parse the pages from Claude's wiki JSON, repairing unescaped newlines if needed.
+
+    Args:
+        response_text: Raw response text from Claude
+
+    Returns:
+        List of pages, or None if the response is not valid JSON
+    """
     try:
-        # Try to find JSON in response
+        # Remove a markdown code block wrapped around the JSON
         response_text = response_text.strip()
-        if response_text.startswith("```"):
-            # Remove markdown code blocks
-            lines = response_text.split("\n")
-            response_text = "\n".join(lines[1:-1])
-
-        result = json.loads(response_text)
-        logger.info(f"Generated {len(result.get('pages', []))} wiki pages")
-        return result
-    except json.JSONDecodeError as e:
+        fenced = _CODE_FENCE_RE.fullmatch(response_text)
+        if fenced:
+            response_text = fenced.group(1)
+
+        return orjson.loads(response_text).get("pages", [])
+    except orjson.JSONDecodeError as e:
         logger.warning(f"Initial JSON parse failed: {e}, attempting to fix newlines")
         # Try to fix unescaped newlines in JSON strings
         try:
             # Fix newlines inside JSON string values
             fixed_text = fix_json_newlines(response_text)
-            result = json.loads(fixed_text)
-            logger.info(f"Generated {len(result.get('pages', []))} wiki pages (after fixing)")
-            return result
-        except json.JSONDecodeError as e2:
+            return orjson.loads(fixed_text).get("pages", [])
+        except orjson.JSONDecodeError as e2:
             logger.error(f"Failed to parse Claude response even after fix: {e2}")
             logger.error(f"Response was: {response_text[:500]}")
-            return {
-                "pages": [{
-                    "slug": "overview",
-                    "title": "Overview",
-                    "content": f"# {repo_name}\n\nWiki generation failed. Please try again.",
-                    "order": 1,
-                    "parent_slug": None,
-                    "diagrams": []
-                }]
-            }
+            return None
+
+
+def module_slug(module: str) -> str:
+    """Build a page slug from a module name."""
+    return re.sub(r"[^a-z0-9]+", "-", module.lower()).strip("-") or "module"
+
+
+def failed_module_page(module: str) -> dict[str, Any]:
+    """Build the placeholder page for a module whose generation failed."""
+    return {
+        "slug": module_slug(module),
+        "title": module,
+        "content": f"# {module}\n\nGeneration of this module's documentation failed. Please regenerate the wiki to retry.",
+        "order": 0,
+        "parent_slug": "overview",
+        "diagrams": []
+    }
+
+
+def merge_wiki_pages(
+    repo_name: str,
+    modules: list[str],
+    page_lists: list[Optional[list[dict[str, Any]]]],
+) -> dict[str, Any]:
+    """
+    Merge the pages generated per prompt into one wiki, in prompt order.
+
+    Failed sections get a placeholder page, so an incomplete wiki is visible
+    as such and regenerating it fills in the missing sections.
+
+    Args:
+        repo_name: Repository name for the fallback page
+        modules: Module names of the prompts after the overview
+        page_lists: Parsed pages for each prompt from build_wiki_prompts
+            (None where generation failed), overview first
+
+    Returns:
+        Dictionary with 'pages' list
+    """
+    if all(pages is None for pages in page_lists):
+        return fallback_wiki(repo_name, "Wiki generation failed. Please try again.")
+
+    overview, *module_pages = page_lists
+    if not overview:
+        # Module pages hang off the overview, so keep a placeholder for it
+        overview = fallback_wiki(repo_name, "Overview generation failed. Please try again.")["pages"]
+
+    pages = list(overview)
+    for module, module_page_list in zip(modules, module_pages):
+        if module_page_list is None:
+            logger.warning(f"Wiki generation failed for {repo_name} module {module}")
+            module_page_list = [failed_module_page(module)]
+        pages.extend(module_page_list)
+
+    # Each prompt numbers its pages independently; copy the pages, as they
+    # may be shared with the wiki cache
+    pages = [{**page, "order": order} for order, page in enumerate(pages, start=1)]
+
+    logger.info(f"Generated {len(pages)} wiki pages")
+    return {"pages": pages}
+
+
+async def lookup_cached_pages(
+    namespace: tuple[str, Optional[str]],
+    prompt: str,
+    refresh: bool = False,
+) -> tuple[Optional[np.ndarray], Optional[list[dict[str, Any]]]]:
+    """
+    Look up previously generated pages for a prompt.
+
+    Pages generated for the exact same prompt are returned first; otherwise
+    the semantic wiki cache is searched, for prompts within the embedder's
+    input limit.
+
+    Args:
+        namespace: (repo_id, module) of the prompt; module is None for the overview
+        prompt: Prompt from build_wiki_prompts
+        refresh: Skip both caches; the embedding is still returned so the
+            regenerated pages replace the cached ones
+
+    Returns:
+        The prompt embedding (None if caching is disabled, the prompt exceeds
+        the embedder's input limit, TEI is unavailable or the exact prompt
+        was found) and the cached pages, if any
+    """
+    if not settings.wiki_cache_enabled:
+        return None, None
+
+    if not refresh:
+        pages = _section_cache.get(section_cache_key(namespace, prompt))
+        if pages is not None:
+            return None, pages
+
+    limit = settings.wiki_cache_max_prompt_tokens or await max_input_tokens()
+    if limit is None or estimate_tokens(prompt) > limit:
+        return None, None
+
+    try:
+        embedding = await embed(prompt)
+    except httpx.HTTPError as e:
+        logger.warning(f"Embedding failed, skipping wiki cache: {e}")
+        return None, None
+
+    if refresh:
+        return embedding, None
+    return embedding, wiki_cache.get(namespace, embedding)
+
+
+def section_cache_key(namespace: tuple[str, Optional[str]], prompt: str) -> tuple:
+    """Build the exact section cache key from the namespace and a prompt digest."""
+    return (*namespace, hashlib.blake2b(prompt.encode()).digest())
+
+
+def store_cached_pages(
+    namespace: tuple[str, Optional[str]],
+    prompt: str,
+    embedding: Optional[np.ndarray],
+    pages: Optional[list[dict[str, Any]]],
+) -> None:
+    """
+    Remember the pages generated for a prompt.
+
+    Args:
+        namespace: (repo_id, module) of the prompt
+        prompt: Prompt the pages were generated from
+        embedding: Prompt embedding from lookup_cached_pages, if any
+        pages: Parsed pages, or None if generation failed (nothing is stored)
+    """
+    if pages is None or not settings.wiki_cache_enabled:
+        return
+
+    _section_cache[section_cache_key(namespace, prompt)] = pages
+    if embedding is not None:
+        wiki_cache.put(namespace, embedding, pages)
+
+
+def response_text(message: Any) -> str:
+    """Join the text blocks of a Claude message."""
+    return "".join(block.text for block in message.content if hasattr(block, "text"))
+
+
+async def stream_wiki_text(prompt: str, model: str) -> str:
+    """
+    Stream Claude's answer to one wiki prompt within the client-side rate limits.
+
+    Args:
+        prompt: Prompt from build_wiki_prompts
+        model: Model from pick_wiki_model
+
+    Returns:
+        Response text
+    """
+    buffer = io.StringIO()
+    async with stream_message(**wiki_request_params(prompt, model)) as stream:
+        async for text in stream.text_stream:
+            buffer.write(text)
+    return buffer.getvalue()
+
+
+def wiki_request_params(prompt: str, model: str) -> dict[str, Any]:
+    """Build messages.create arguments for one wiki prompt."""
+    return {
+        "model": model,
+        "max_tokens": WIKI_MAX_TOKENS,
+        "system": WIKI_SYSTEM,
+        "messages": [{"role": "user", "content": prompt}],
+    }
+
+
+@dataclass
+class WikiPlan:
+    """
+    What generating a repository's wiki requires.
+
+    Either `result` holds a wiki that needs no Claude call (no structure, or
+    a trivial repository), or `sections` lists the prompts to send, each with
+    its (repo_id, module) cache namespace; module is None for the overview.
+    """
+
+    repo_name: str
+    model: str = ""
+    sections: list[tuple[tuple[str, Optional[str]], str]] = field(default_factory=list)
+    result: Optional[dict[str, Any]] = None
+
+    @property
+    def modules(self) -> list[str]:
+        """Module names of the sections after the overview."""
+        return [module for (_, module), _ in self.sections[1:]]
+
+
+async def plan_wiki(repo_id: str, repo_name: str) -> WikiPlan:
+    """
+    Load a repository's structure and decide how to document it.
+
+    Args:
+        repo_id: Repository ID
+        repo_name: Repository name for display
+
+    Returns:
+        WikiPlan with either a finished result or the prompts to send
+    """
+    # Get code structure from Neo4j
+    modules = await get_code_structure(repo_id)
+
+    if not modules:
+        return WikiPlan(repo_name, result=fallback_wiki(repo_name, NO_STRUCTURE_MESSAGE))
+
+    if count_declarations(modules) < TRIVIAL_REPO_DECLARATIONS:
+        logger.info(f"Trivial repository {repo_name}, rendering wiki directly")
+        return WikiPlan(repo_name, result=render_structure_wiki(repo_name, modules))
+
+    prompts = build_wiki_prompts(repo_name, modules)
+    namespaces = [(repo_id, section) for section in (None, *modules)]
+    model = pick_wiki_model(modules)
+
+    logger.info(f"Generating wiki for {repo_name} with {len(modules)} modules using {model}")
+    return WikiPlan(repo_name, model=model, sections=list(zip(namespaces, prompts)))
+
+
+async def generate_wiki(repo_id: str, repo_name: str, refresh: bool = False) -> dict[str, Any]:
+    """
+    Generate wiki pages for a repository using Claude.
+
+    The overview and each module are generated by separate, concurrent
+    calls, so large repositories are not serialized into one completion
+    bounded by a single output limit.
+
+    Args:
+        repo_id: Repository ID
+        repo_name: Repository name for display
+        refresh: Regenerate every section instead of reusing cached pages
+
+    Returns:
+        Dictionary with 'pages' list
+    """
+    plan = await plan_wiki(repo_id, repo_name)
+    if plan.result is not None:
+        return plan.result
+
+    semaphore = asyncio.Semaphore(settings.wiki_prompt_concurrency)
+
+    async def generate_pages(
+        namespace: tuple[str, Optional[str]], prompt: str
+    ) -> Optional[list[dict[str, Any]]]:
+        embedding, pages = await lookup_cached_pages(namespace, prompt, refresh)
+        if pages is not None:
+            logger.info(f"Wiki cache hit for {repo_name} section {namespace[1] or 'overview'}")
+            return pages
+
+        async with semaphore:
+            try:
+                text = await stream_wiki_text(prompt, plan.model)
+            except Exception as e:
+                logger.error(f"Wiki page generation failed for {repo_name}: {e}")
+                return None
+
+        pages = parse_wiki_pages(text)
+        store_cached_pages(namespace, prompt, embedding, pages)
+        return pages
+
+    page_lists = await asyncio.gather(*(
+        generate_pages(namespace, prompt) for namespace, prompt in plan.sections
+    ))
+    return merge_wiki_pages(repo_name, plan.modules, page_lists)
+
+
+async def generate_wikis(
+    repos: list[tuple[str, str]],
+    concurrency: int = 8,
+    refresh: bool = False,
+) -> dict[str, dict[str, Any]]:
+    """
+    Generate wikis for several repositories concurrently.
+
+    Up to `concurrency` repositories are in flight at once, so Neo4j queries
+    and Claude generation of different repositories overlap.
+
+    Args:
+        repos: (repo_id, repo_name) pairs
+        concurrency: Maximum number of repositories generated at once
+        refresh: Regenerate every section instead of reusing cached pages
+
+    Returns:
+        Dictionary mapping repo_id to its {'pages': [...]} result
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def generate_one(repo_id: str, repo_name: str) -> dict[str, Any]:
+        async with semaphore:
+            try:
+                return await generate_wiki(repo_id, repo_name, refresh)
+            except Exception as e:
+                logger.error(f"Failed to generate wiki for {repo_name}: {e}", exc_info=True)
+                return fallback_wiki(repo_name, "Wiki generation failed. Please try again.")
+
+    repo_names = dict(repos)
+    results = await asyncio.gather(*(
+        generate_one(repo_id, repo_name) for repo_id, repo_name in repo_names.items()
+    ))
+    return dict(zip(repo_names, results))
+
+
+@dataclass
+class WikiBatchJob:
+    """A multi-repository wiki generation submitted to the Message Batches API."""
+
+    repo_names: dict[str, str]
+    # Wikis that needed no Claude call, or every wiki once the batch ended
+    results: dict[str, dict[str, Any]] = field(default_factory=dict)
+    # repo_id -> pages per section, filled from the cache and the batch results
+    page_lists: dict[str, list[Optional[list[dict[str, Any]]]]] = field(default_factory=dict)
+    # repo_id -> module names of the sections after the overview
+    modules: dict[str, list[str]] = field(default_factory=dict)
+    # custom_id -> (repo_id, prompt index, cache namespace, prompt, prompt embedding)
+    request_ids: dict[str, tuple] = field(default_factory=dict)
+    batch_id: Optional[str] = None
+    ended: bool = False
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+# Submitted batch jobs by job id. Batches may take up to a day to process, so
+# jobs are kept for two days; they live in this process only.
+_batch_jobs: TTLCache = TTLCache(maxsize=256, ttl=2 * 86400)
+
+
+async def submit_wiki_batch(repos: list[tuple[str, str]], refresh: bool = False) -> str:
+    """
+    Submit wikis for several repositories to the Message Batches API.
+
+    Batched requests are billed at half price and processed asynchronously,
+    which suits bulk, non-interactive generation. Sections found in the wiki
+    caches are not submitted. Poll get_wiki_batch with the returned id.
+
+    Args:
+        repos: (repo_id, repo_name) pairs
+        refresh: Submit every section instead of reusing cached pages
+
+    Returns:
+        Job id for get_wiki_batch
+    """
+    job = WikiBatchJob(repo_names=dict(repos))
+    requests = []
+
+    for repo_index, (repo_id, repo_name) in enumerate(job.repo_names.items()):
+        plan = await plan_wiki(repo_id, repo_name)
+        if plan.result is not None:
+            job.results[repo_id] = plan.result
+            continue
+
+        job.page_lists[repo_id] = [None] * len(plan.sections)
+        job.modules[repo_id] = plan.modules
+        for prompt_index, (namespace, prompt) in enumerate(plan.sections):
+            embedding, pages = await lookup_cached_pages(namespace, prompt, refresh)
+            if pages is not None:
+                job.page_lists[repo_id][prompt_index] = pages
+                continue
+
+            custom_id = f"{repo_index}-{prompt_index}"
+            job.request_ids[custom_id] = (repo_id, prompt_index, namespace, prompt, embedding)
+            requests.append({"custom_id": custom_id, "params": wiki_request_params(prompt, plan.model)})
+
+    if requests:
+        batch = await client.messages.batches.create(requests=requests)
+        job.batch_id = batch.id
+        logger.info(f"Submitted wiki batch {batch.id} with {len(requests)} requests")
+
+    job_id = uuid.uuid4().hex
+    _batch_jobs[job_id] = job
+    return job_id
+
+
+async def get_wiki_batch(job_id: str) -> Optional[tuple[str, Optional[dict[str, dict[str, Any]]]]]:
+    """
+    Check a submitted wiki batch and collect its results once it has ended.
+
+    Args:
+        job_id: Id returned by submit_wiki_batch
+
+    Returns:
+        None for an unknown job, otherwise (processing status, wikis) where
+        wikis maps repo_id to its {'pages': [...]} result once the status is
+        "ended" and is None before
+    """
+    job = _batch_jobs.get(job_id)
+    if job is None:
+        return None
+
+    async with job.lock:
+        if job.ended:
+            return "ended", job.results
+
+        if job.batch_id is not None:
+            batch = await client.messages.batches.retrieve(job.batch_id)
+            if batch.processing_status != "ended":
+                return batch.processing_status, None
+
+            async for entry in await client.messages.batches.results(job.batch_id):
+                repo_id, prompt_index, namespace, prompt, embedding = job.request_ids[entry.custom_id]
+                if entry.result.type == "succeeded":
+                    pages = parse_wiki_pages(response_text(entry.result.message))
+                    job.page_lists[repo_id][prompt_index] = pages
+                    store_cached_pages(namespace, prompt, embedding, pages)
+                else:
+                    logger.error(f"Wiki batch request {entry.custom_id} for {repo_id} {entry.result.type}")
+
+        for repo_id, pages in job.page_lists.items():
+            job.results[repo_id] = merge_wiki_pages(job.repo_names[repo_id], job.modules[repo_id], pages)
+        job.ended = True
+        return "ended", job.results
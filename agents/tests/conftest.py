@@ -0,0 +1,33 @@
+"""Shared test fixtures."""
+import asyncio
+import types
+
+import pytest
+
+
+class FakeClock:
+    """Monotonic clock that only advances when slept on."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replace time and sleeps in the rate limiter and semantic cache with a fake clock."""
+    from src import rate_limit
+    from src.cache import semantic
+
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limit, "time", fake)
+    monkeypatch.setattr(rate_limit, "asyncio", types.SimpleNamespace(Lock=asyncio.Lock, sleep=fake.sleep))
+    monkeypatch.setattr(semantic, "time", fake)
+    return fake
@@ -0,0 +1,144 @@
+"""Tests for prompt-cache breakpoints and compaction of the chat loop history."""
+import asyncio
+import copy
+from types import SimpleNamespace
+
+from src import server
+from src.server import (
+    COMPACT_TOOL_RESULT_TURNS,
+    ELIDED_TOOL_RESULT_PREFIX,
+    KEEP_TOOL_RESULT_TURNS,
+    MAX_MESSAGE_CACHE_BREAKPOINTS,
+    add_cache_breakpoint,
+    compact_history,
+)
+
+
+def tool_result_blocks(turn: int) -> list:
+    return [{"type": "tool_result", "tool_use_id": f"t{turn}", "content": "x" * 50}]
+
+
+def test_breakpoint_marks_last_block_of_message():
+    blocks = [{"type": "tool_result", "content": "a"}, {"type": "tool_result", "content": "b"}]
+    breakpoints = []
+    add_cache_breakpoint(blocks, breakpoints)
+
+    assert "cache_control" not in blocks[0]
+    assert blocks[1]["cache_control"] == server.CACHE_CONTROL
+    assert breakpoints == [blocks[1]]
+
+
+def test_only_newest_breakpoints_stay_marked():
+    messages = [tool_result_blocks(turn) for turn in range(MAX_MESSAGE_CACHE_BREAKPOINTS + 2)]
+    breakpoints = []
+    for blocks in messages:
+        add_cache_breakpoint(blocks, breakpoints)
+
+    marked = [blocks for blocks in messages if "cache_control" in blocks[-1]]
+    assert marked == messages[-MAX_MESSAGE_CACHE_BREAKPOINTS:]
+    assert len(breakpoints) == MAX_MESSAGE_CACHE_BREAKPOINTS
+
+
+def conversation(turns: int) -> list:
+    messages = [{"role": "user", "content": "question"}]
+    for turn in range(turns):
+        messages.append({"role": "assistant", "content": [SimpleNamespace(type="tool_use", id=f"t{turn}")]})
+        messages.append({"role": "user", "content": tool_result_blocks(turn)})
+    return messages
+
+
+def tool_results(messages: list) -> list:
+    return [
+        block["content"]
+        for message in messages
+        if message["role"] == "user" and isinstance(message["content"], list)
+        for block in message["content"]
+    ]
+
+
+def test_history_below_batch_size_is_untouched():
+    messages = conversation(KEEP_TOOL_RESULT_TURNS + COMPACT_TOOL_RESULT_TURNS - 1)
+    before = copy.deepcopy(tool_results(messages))
+    compact_history(messages)
+    assert tool_results(messages) == before
+
+
+def test_compaction_keeps_only_recent_turns_verbatim():
+    turns = KEEP_TOOL_RESULT_TURNS + COMPACT_TOOL_RESULT_TURNS
+    messages = conversation(turns)
+    compact_history(messages)
+
+    results = tool_results(messages)
+    assert all(result.startswith(ELIDED_TOOL_RESULT_PREFIX) for result in results[:-KEEP_TOOL_RESULT_TURNS])
+    assert results[-KEEP_TOOL_RESULT_TURNS:] == ["x" * 50] * KEEP_TOOL_RESULT_TURNS
+    # The question itself is never compacted
+    assert messages[0]["content"] == "question"
+
+
+def test_elided_turns_are_not_rewritten_again():
+    messages = conversation(KEEP_TOOL_RESULT_TURNS + COMPACT_TOOL_RESULT_TURNS)
+    compact_history(messages)
+    before = copy.deepcopy(tool_results(messages))
+
+    # New turns that stay below the next batch leave the history alone
+    for turn in range(COMPACT_TOOL_RESULT_TURNS - 1):
+        messages.append({"role": "user", "content": tool_result_blocks(100 + turn)})
+        compact_history(messages)
+    assert tool_results(messages)[:len(before)] == before
+
+
+def test_chat_loop_keeps_cached_prefixes_stable(monkeypatch):
+    """Each request should reuse the prefix up to the previous request's breakpoints."""
+    requests = []
+
+    async def fake_create_message(**kwargs):
+        requests.append(copy.deepcopy([
+            {**message, "content": [
+                block if isinstance(block, dict) else {"tool_use": block.id}
+                for block in message["content"]
+            ]} if isinstance(message["content"], list) else message
+            for message in kwargs["messages"]
+        ]))
+        if len(requests) < server.MAX_ITERATIONS:
+            return SimpleNamespace(
+                stop_reason="tool_use",
+                content=[SimpleNamespace(type="tool_use", id=f"t{len(requests)}", name="find_function",
+                                         input={"pattern": f"p{len(requests)}"})],
+            )
+        return SimpleNamespace(stop_reason="end_turn", content=[SimpleNamespace(type="text", text="done")])
+
+    async def no_embedding(message):
+        return None
+
+    monkeypatch.setattr(server, "create_message", fake_create_message)
+    monkeypatch.setattr(server, "execute_tool", lambda name, args: [{"result": "x" * 50}])
+    monkeypatch.setattr(server, "embed_message", no_embedding)
+
+    response = asyncio.run(server.chat(server.ChatRequest(message="question")))
+    assert response.response == "done"
+
+    def marked(messages):
+        return [
+            index for index, message in enumerate(messages)
+            if isinstance(message["content"], list)
+            and any("cache_control" in block for block in message["content"])
+        ]
+
+    def unmarked(message):
+        message = copy.deepcopy(message)
+        if isinstance(message["content"], list):
+            for block in message["content"]:
+                block.pop("cache_control", None)
+        return message
+
+    misses = 0
+    for previous, current in zip(requests, requests[1:]):
+        assert len(marked(current)) <= MAX_MESSAGE_CACHE_BREAKPOINTS
+        breakpoints = marked(previous)
+        if not breakpoints:
+            continue
+        prefix = range(max(breakpoints) + 1)
+        misses += any(unmarked(previous[i]) != unmarked(current[i]) for i in prefix)
+
+    # History is rewritten once, when the first compaction batch is due
+    assert misses == 1
@@ -0,0 +1,81 @@
+"""Tests for repairing raw newlines in Claude's JSON output."""
+import json
+import random
+
+import pytest
+
+from src.wiki.generator import fix_json_newlines
+
+
+def reference_fix_json_newlines(text: str) -> str:
+    """The original character-by-character implementation."""
+    result = []
+    in_string = False
+    escape_next = False
+
+    for char in text:
+        if escape_next:
+            result.append(char)
+            escape_next = False
+            continue
+
+        if char == '\\':
+            escape_next = True
+            result.append(char)
+            continue
+
+        if char == '"':
+            in_string = not in_string
+            result.append(char)
+            continue
+
+        if in_string and char == '\n':
+            result.append('\\n')
+        elif in_string and char == '\t':
+            result.append('\\t')
+        else:
+            result.append(char)
+
+    return ''.join(result)
+
+
+def test_escapes_newlines_and_tabs_inside_strings():
+    text = '{"content": "# Title\n\n\tindented"}'
+    fixed = fix_json_newlines(text)
+    assert json.loads(fixed) == {"content": "# Title\n\n\tindented"}
+
+
+def test_leaves_whitespace_between_tokens():
+    text = '{\n\t"a": 1,\n\t"b": "x"\n}'
+    assert fix_json_newlines(text) == text
+
+
+def test_escaped_quote_does_not_end_string():
+    text = '{"content": "say \\"hi\\"\nbye"}'
+    assert json.loads(fix_json_newlines(text)) == {"content": 'say "hi"\nbye'}
+
+
+def test_existing_escapes_are_kept():
+    text = '{"content": "a\\nb\\\\"}'
+    assert fix_json_newlines(text) == text
+
+
+@pytest.mark.parametrize("text", [
+    "",
+    '"',
+    '"\n',
+    '\\',
+    '"\\',
+    '"\\\n"',
+    'a\n"b\n"c\n',
+    '"unterminated\n\tstring',
+])
+def test_edge_cases_match_reference(text):
+    assert fix_json_newlines(text) == reference_fix_json_newlines(text)
+
+
+def test_random_inputs_match_reference():
+    rng = random.Random(0)
+    for _ in range(20000):
+        text = ''.join(rng.choice('ab"\\\n\t{}:,') for _ in range(rng.randint(0, 40)))
+        assert fix_json_newlines(text) == reference_fix_json_newlines(text), repr(text)
@@ -0,0 +1,115 @@
+"""Tests for the client-side Anthropic rate limiter."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from src import llm
+from src.rate_limit import RateLimiter
+
+
+def acquire(limiter: RateLimiter, times: int = 1) -> None:
+    async def run():
+        for _ in range(times):
+            await limiter.acquire()
+
+    asyncio.run(run())
+
+
+def test_unlimited_never_waits(clock):
+    limiter = RateLimiter()
+    acquire(limiter, 100)
+    limiter.record_usage(10_000)
+    acquire(limiter)
+    assert clock.sleeps == []
+
+
+def test_requests_within_limit_do_not_wait(clock):
+    limiter = RateLimiter(requests_per_minute=3)
+    acquire(limiter, 3)
+    assert clock.sleeps == []
+
+
+def test_request_over_limit_waits_for_oldest_to_leave_window(clock):
+    limiter = RateLimiter(requests_per_minute=2)
+    acquire(limiter)
+    clock.now += 20
+    acquire(limiter)
+    acquire(limiter)
+    # The first request was 20 s ago, so it leaves the window in 40 s
+    assert clock.sleeps == [pytest.approx(40)]
+
+
+def test_requests_spread_over_window_do_not_wait(clock):
+    limiter = RateLimiter(requests_per_minute=2)
+    for _ in range(5):
+        acquire(limiter)
+        clock.now += 30
+    assert clock.sleeps == []
+
+
+def test_token_budget_blocks_until_usage_expires(clock):
+    limiter = RateLimiter(tokens_per_minute=1000)
+    acquire(limiter)
+    limiter.record_usage(600)
+    clock.now += 10
+    acquire(limiter)
+    limiter.record_usage(500)
+    assert clock.sleeps == []
+
+    # 1100 tokens recorded; the 600 from 10 s ago expire in 50 s
+    acquire(limiter)
+    assert clock.sleeps == [pytest.approx(50)]
+
+
+def test_token_budget_ignores_usage_outside_window(clock):
+    limiter = RateLimiter(tokens_per_minute=1000)
+    limiter.record_usage(5000)
+    clock.now += 60
+    acquire(limiter)
+    assert clock.sleeps == []
+
+
+def test_record_usage_without_token_limit_is_ignored(clock):
+    limiter = RateLimiter(requests_per_minute=10)
+    limiter.record_usage(10_000)
+    acquire(limiter)
+    assert clock.sleeps == []
+
+
+def test_concurrent_acquires_are_serialized(clock):
+    limiter = RateLimiter(requests_per_minute=1, window=10.0)
+
+    async def run():
+        await asyncio.gather(*(limiter.acquire() for _ in range(3)))
+
+    asyncio.run(run())
+    assert clock.sleeps == [pytest.approx(10), pytest.approx(10)]
+
+
+def test_stream_message_acquires_and_records_usage(clock, monkeypatch):
+    class FakeStream:
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc_info):
+            return False
+
+        async def get_final_message(self):
+            return SimpleNamespace(usage=SimpleNamespace(input_tokens=700, output_tokens=400))
+
+    limiter = RateLimiter(requests_per_minute=10, tokens_per_minute=1000)
+    monkeypatch.setattr(llm, "rate_limiter", limiter)
+    monkeypatch.setattr(llm, "client", SimpleNamespace(messages=SimpleNamespace(stream=lambda **kwargs: FakeStream())))
+
+    async def run():
+        async with llm.stream_message(model="m") as stream:
+            assert isinstance(stream, FakeStream)
+
+    asyncio.run(run())
+    assert limiter._token_total == 1100
+    assert clock.sleeps == []
+
+    # The budget is now spent, so the next stream waits for it to expire
+    asyncio.run(run())
+    assert clock.sleeps == [pytest.approx(60)]
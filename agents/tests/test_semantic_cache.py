@@ -0,0 +1,83 @@
+"""Tests for the in-memory semantic cache."""
+import numpy as np
+import pytest
+
+from src.cache.semantic import SemanticCache, normalize
+
+
+def test_normalize_scales_to_unit_length():
+    assert np.linalg.norm(normalize([3.0, 4.0])) == pytest.approx(1.0)
+    assert list(normalize([0.0, 0.0])) == [0.0, 0.0]
+
+
+def test_similar_embedding_hits(clock):
+    cache = SemanticCache(threshold=0.9, ttl=60)
+    cache.put("ns", [1.0, 0.0], "value")
+    assert cache.get("ns", [2.0, 0.1]) == "value"
+
+
+def test_dissimilar_embedding_misses(clock):
+    cache = SemanticCache(threshold=0.9, ttl=60)
+    cache.put("ns", [1.0, 0.0], "value")
+    assert cache.get("ns", [0.0, 1.0]) is None
+
+
+def test_returns_most_similar_entry(clock):
+    cache = SemanticCache(threshold=0.5, ttl=60)
+    cache.put("ns", [1.0, 0.0], "x")
+    cache.put("ns", [1.0, 1.0], "diagonal")
+    cache.put("ns", [0.0, 1.0], "y")
+    assert cache.get("ns", [0.9, 1.0]) == "diagonal"
+    assert cache.get("ns", [0.1, 1.0]) == "y"
+
+
+def test_namespaces_do_not_share_entries(clock):
+    cache = SemanticCache(threshold=0.9, ttl=60)
+    cache.put(("repo-a", None), [1.0, 0.0], "a")
+    cache.put(("repo-b", None), [1.0, 0.0], "b")
+    assert cache.get(("repo-a", None), [1.0, 0.0]) == "a"
+    assert cache.get(("repo-b", None), [1.0, 0.0]) == "b"
+    assert cache.get(("repo-c", None), [1.0, 0.0]) is None
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = SemanticCache(threshold=0.9, ttl=60)
+    cache.put("ns", [1.0, 0.0], "old")
+    clock.now += 30
+    cache.put("other", [1.0, 0.0], "new")
+
+    clock.now += 29
+    assert cache.get("ns", [1.0, 0.0]) == "old"
+
+    clock.now += 1
+    assert cache.get("ns", [1.0, 0.0]) is None
+    assert cache.get("other", [1.0, 0.0]) == "new"
+    assert len(cache) == 1
+
+
+def test_oldest_entry_evicted_across_namespaces(clock):
+    cache = SemanticCache(threshold=0.9, ttl=60, maxsize=2)
+    cache.put("a", [1.0, 0.0], "first")
+    cache.put("b", [1.0, 0.0], "second")
+    cache.put("a", [0.0, 1.0], "third")
+
+    assert len(cache) == 2
+    assert cache.get("a", [1.0, 0.0]) is None
+    assert cache.get("b", [1.0, 0.0]) == "second"
+    assert cache.get("a", [0.0, 1.0]) == "third"
+
+
+def test_put_after_lookup_is_matched(clock):
+    cache = SemanticCache(threshold=0.9, ttl=60)
+    cache.put("ns", [1.0, 0.0], "x")
+    assert cache.get("ns", [0.0, 1.0]) is None
+    cache.put("ns", [0.0, 1.0], "y")
+    assert cache.get("ns", [0.0, 1.0]) == "y"
+
+
+def test_clear_removes_everything(clock):
+    cache = SemanticCache(threshold=0.9, ttl=60)
+    cache.put("ns", [1.0, 0.0], "value")
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.get("ns", [1.0, 0.0]) is None
@@ -0,0 +1,163 @@
+"""Tests for the pure helpers of wiki generation."""
+import pytest
+
+from src.wiki.generator import (
+    MAX_DOCSTRING_CHARS,
+    compact_file,
+    is_valid_repo_id,
+    merge_wiki_pages,
+    module_name,
+    parse_wiki_pages,
+)
+
+
+@pytest.mark.parametrize("repo_id", [
+    "0b8e7c4e-6a59-4c1f-9d6e-2f3a4b5c6d7e",
+    "0B8E7C4E-6A59-4C1F-9D6E-2F3A4B5C6D7E",
+])
+def test_canonical_uuids_are_valid(repo_id):
+    assert is_valid_repo_id(repo_id)
+
+
+@pytest.mark.parametrize("repo_id", [
+    "",
+    "repo-123",
+    "0b8e7c4e6a594c1f9d6e2f3a4b5c6d7e",
+    "{0b8e7c4e-6a59-4c1f-9d6e-2f3a4b5c6d7e}",
+    "urn:uuid:0b8e7c4e-6a59-4c1f-9d6e-2f3a4b5c6d7e",
+    "0b8e7c4e-6a59-4c1f-9d6e-2f3a4b5c6d7e'}) MATCH (n) DETACH DELETE n //",
+])
+def test_other_ids_are_rejected(repo_id):
+    assert not is_valid_repo_id(repo_id)
+
+
+@pytest.mark.parametrize("path, module", [
+    ("main.py", "root"),
+    ("README.md", "root"),
+    ("pkg/api/handlers.go", "api"),
+    ("backend/internal/api/routes.go", "api"),
+    ("src/server.py", "server"),
+    ("src/index.ts", "index"),
+    ("src/config.json", "config.json"),
+    # Only the trailing extension is stripped
+    ("src/py.go.py", "py.go"),
+    ("agents/src/wiki/generator.py", "wiki"),
+])
+def test_module_name(path, module):
+    assert module_name(path) == module
+
+
+def function_names(file_data):
+    return [fn["name"] for fn in compact_file(file_data)["functions"]]
+
+
+def test_compact_file_drops_undocumented_private_functions():
+    file_data = {"path": "src/a.py", "classes": [], "functions": [
+        {"name": "_helper", "signature": "def _helper():", "docstring": ""},
+        {"name": "_documented", "signature": "def _documented():", "docstring": "Kept."},
+        {"name": "__init__", "signature": "def __init__(self):", "docstring": ""},
+        {"name": "public", "signature": "def public():", "docstring": ""},
+    ]}
+    assert function_names(file_data) == ["_documented", "__init__", "public"]
+
+
+def test_compact_file_keeps_methods_sharing_a_bare_signature():
+    file_data = {"path": "src/a.py", "classes": [], "functions": [
+        {"name": "run", "signature": "def run(self):", "docstring": "Run the parser."},
+        {"name": "run", "signature": "def run(self):", "docstring": "Run the writer."},
+        {"name": "__init__", "signature": "def __init__(self):", "docstring": ""},
+        {"name": "__init__", "signature": "def __init__(self):", "docstring": ""},
+    ]}
+    functions = compact_file(file_data)["functions"]
+    assert [fn.get("docstring") for fn in functions] == ["Run the parser.", "Run the writer.", None]
+
+
+def test_compact_file_drops_empty_fields_and_truncates_docstrings():
+    file_data = {"path": "src/a.py", "language": "python", "functions": [
+        {"name": "f", "signature": "", "docstring": "d" * (MAX_DOCSTRING_CHARS + 50)},
+    ], "classes": [
+        {"name": "C", "docstring": None},
+    ]}
+    compacted = compact_file(file_data)
+    assert compacted["functions"] == [{"name": "f", "docstring": "d" * MAX_DOCSTRING_CHARS}]
+    assert compacted["classes"] == [{"name": "C"}]
+    assert compacted["language"] == "python"
+    # The input is not modified
+    assert len(file_data["functions"][0]["docstring"]) == MAX_DOCSTRING_CHARS + 50
+
+
+PAGES_JSON = '{"pages": [{"slug": "overview", "content": "# Title"}]}'
+PAGES = [{"slug": "overview", "content": "# Title"}]
+
+
+@pytest.mark.parametrize("text", [
+    PAGES_JSON,
+    f"  {PAGES_JSON}\n",
+    f"```json\n{PAGES_JSON}\n```",
+    f"```\n{PAGES_JSON}\n```",
+    f"\n```JSON \n{PAGES_JSON}\n\n```\n",
+])
+def test_parse_wiki_pages_strips_a_wrapping_fence(text):
+    assert parse_wiki_pages(text) == PAGES
+
+
+def test_parse_wiki_pages_keeps_fences_inside_content():
+    text = '{"pages": [{"slug": "a", "content": "```python\\nx = 1\\n```"}]}'
+    assert parse_wiki_pages(text) == [{"slug": "a", "content": "```python\nx = 1\n```"}]
+
+
+def test_parse_wiki_pages_repairs_raw_newlines():
+    text = '```json\n{"pages": [{"slug": "a", "content": "line 1\nline 2"}]}\n```'
+    assert parse_wiki_pages(text) == [{"slug": "a", "content": "line 1\nline 2"}]
+
+
+def test_parse_wiki_pages_without_pages_key():
+    assert parse_wiki_pages("{}") == []
+
+
+def test_parse_wiki_pages_rejects_invalid_json():
+    assert parse_wiki_pages("Sorry, I cannot help with that.") is None
+    assert parse_wiki_pages("```json\n{\"pages\": [\n```") is None
+
+
+def page(slug, order=1, parent_slug="overview"):
+    return {"slug": slug, "title": slug, "content": "", "order": order, "parent_slug": parent_slug}
+
+
+def test_merge_renumbers_pages_in_prompt_order():
+    overview = [page("overview", parent_slug=None)]
+    api = [page("api"), page("api-handlers", order=2, parent_slug="api")]
+    core = [page("core")]
+
+    pages = merge_wiki_pages("repo", ["api", "core"], [overview, api, core])["pages"]
+    assert [(p["slug"], p["order"]) for p in pages] == [
+        ("overview", 1), ("api", 2), ("api-handlers", 3), ("core", 4),
+    ]
+    # Cached page lists are copied, not renumbered in place
+    assert api[1]["order"] == 2
+
+
+def test_merge_keeps_a_placeholder_for_failed_modules():
+    pages = merge_wiki_pages(
+        "repo", ["api", "src/Core Utils"], [[page("overview", parent_slug=None)], None, [page("x")]]
+    )["pages"]
+
+    assert [p["slug"] for p in pages] == ["overview", "api", "x"]
+    assert pages[1]["parent_slug"] == "overview"
+    assert "failed" in pages[1]["content"]
+
+    pages = merge_wiki_pages("repo", ["src/Core Utils"], [[page("overview", parent_slug=None)], None])["pages"]
+    assert pages[1]["slug"] == "src-core-utils"
+
+
+def test_merge_keeps_a_placeholder_for_a_failed_overview():
+    pages = merge_wiki_pages("repo", ["api"], [None, [page("api")]])["pages"]
+    assert [(p["slug"], p["parent_slug"]) for p in pages] == [("overview", None), ("api", "overview")]
+    assert "failed" in pages[0]["content"]
+
+
+def test_merge_with_every_section_failed_returns_fallback():
+    pages = merge_wiki_pages("repo", ["api"], [None, None])["pages"]
+    assert len(pages) == 1
+    assert pages[0]["slug"] == "overview"
+    assert pages[0]["content"].startswith("# repo")